@@ -0,0 +1,186 @@
+import sys
+import glob
+import json
+import time
+import argparse
+import tracemalloc
+import numpy as np
+import suso
+
+# stage timings for fixed puzzle sets, written as json and compared against a stored baseline.
+#   python benchmark.py --output results.json
+#   python benchmark.py --output results.json --baseline baseline.json --threshold 0.25
+
+STAGES = ["parse","convert","propagate","guess"]
+PERCENTILES = [50,90,99]
+
+
+def load_benchmark_sets(sample_size=1000, seed=0, finnish_path="boards/finnish.csv", hard_path="boards/sudoku_hard.csv"):
+    # name -> list of 81 character board strings
+    benchmark_sets = {}
+
+    text_boards = []
+    for path in sorted(glob.glob("boards/*.txt")):
+        board = suso.SudokuBoard()
+        with open(path) as board_file:
+            board.import_file(board_file)
+        text_boards.append(board.print_board_string())
+    benchmark_sets["text_boards"] = text_boards
+
+    (quizzes,solutions) = suso.load_puzzles(hard_path)
+    benchmark_sets["sudoku_hard"] = [(quiz + ord("0")).tobytes().decode("ascii") for quiz in quizzes]
+
+    # a seeded sample, so every run sees the same puzzles
+    (quizzes,solutions) = suso.load_puzzles(finnish_path)
+    rng = np.random.default_rng(seed)
+    sample = np.sort(rng.choice(len(quizzes),size=min(sample_size,len(quizzes)),replace=False))
+    benchmark_sets["finnish_sample"] = [(quizzes[i] + ord("0")).tobytes().decode("ascii") for i in sample]
+
+    return benchmark_sets
+
+def run_stages(board_string, timer=time.perf_counter, on_stage=None):
+    # play one board through every stage, returning the seconds spent in each.
+    # on_stage(stage) is called when a stage finishes (used for the memory pass)
+    times = {}
+
+    start = timer()
+    board = suso.SudokuBoard()
+    board.initialize_board_from_string(board_string)
+    times["parse"] = timer() - start
+    if on_stage is not None:
+        on_stage("parse")
+
+    start = timer()
+    suso.SudokuBoard.convert_known_values_to_possibilities(board.known_values)
+    times["convert"] = timer() - start
+    if on_stage is not None:
+        on_stage("convert")
+
+    start = timer()
+    board.apply_constraints_iteratively()
+    times["propagate"] = timer() - start
+    if on_stage is not None:
+        on_stage("propagate")
+
+    # only boards that propagation leaves valid and unfinished need guessing
+    if board.valid() and board.filled_cells() < 81:
+        start = timer()
+        guesser = suso.SudokuGuesser()
+        guesser.add_board(board,None,None)
+        guesser.process_board(board.print_board_string())
+        times["guess"] = timer() - start
+        if on_stage is not None:
+            on_stage("guess")
+
+    return times
+
+def summarize(times):
+    if len(times) == 0:
+        return {"count": 0}
+    times = np.array(times)
+    summary = {"count": len(times),
+               "total": float(np.sum(times)),
+               "mean": float(np.mean(times)),
+               "max": float(np.max(times))}
+    for percentile in PERCENTILES:
+        summary[f"p{percentile}"] = float(np.percentile(times,percentile))
+    return summary
+
+def measure_memory(board_strings):
+    # peak traced allocation per stage, in bytes. a separate pass, since tracing slows everything
+    peaks = {stage: 0 for stage in STAGES}
+
+    def on_stage(stage):
+        current, peak = tracemalloc.get_traced_memory()
+        peaks[stage] = max(peaks[stage],peak)
+        tracemalloc.reset_peak()
+
+    tracemalloc.start()
+    try:
+        for board_string in board_strings:
+            tracemalloc.reset_peak()
+            run_stages(board_string,on_stage=on_stage)
+    finally:
+        tracemalloc.stop()
+    return peaks
+
+def run_benchmark(benchmark_sets, repeats=1, memory=True):
+    results = {"meta": {"repeats": repeats,"numpy": np.__version__,"python": sys.version.split()[0]},
+               "sets": {}}
+    for name, board_strings in benchmark_sets.items():
+        stage_times = {stage: [] for stage in STAGES}
+        for repeat in range(repeats):
+            for board_string in board_strings:
+                for stage, seconds in run_stages(board_string).items():
+                    stage_times[stage].append(seconds)
+
+        set_results = {"boards": len(board_strings),"stages": {}}
+        for stage in STAGES:
+            set_results["stages"][stage] = summarize(stage_times[stage])
+        if memory:
+            for stage, peak in measure_memory(board_strings).items():
+                set_results["stages"][stage]["peak_bytes"] = peak
+        results["sets"][name] = set_results
+    return results
+
+def compare_to_baseline(results, baseline, threshold=0.25, metric="p50"):
+    # list of (set, stage, baseline value, new value) for every stage that got slower than
+    # baseline*(1+threshold). stages missing from either side are skipped
+    regressions = []
+    for name, set_results in results["sets"].items():
+        if name not in baseline["sets"]:
+            continue
+        for stage, summary in set_results["stages"].items():
+            baseline_summary = baseline["sets"][name]["stages"].get(stage,{})
+            if metric not in summary or metric not in baseline_summary:
+                continue
+            if summary[metric] > baseline_summary[metric]*(1 + threshold):
+                regressions.append((name,stage,baseline_summary[metric],summary[metric]))
+    return regressions
+
+def print_results(results):
+    for name, set_results in results["sets"].items():
+        print(f"**** {name} ({set_results['boards']} boards) ****")
+        for stage, summary in set_results["stages"].items():
+            if summary["count"] == 0:
+                print(f"\t{stage:10s} (not reached)")
+                continue
+            percentiles = " ".join([f"p{percentile}={summary[f'p{percentile}']*1e6:.1f}us" for percentile in PERCENTILES])
+            peak = f" peak={summary['peak_bytes']/1024:.1f}KiB" if "peak_bytes" in summary else ""
+            print(f"\t{stage:10s} n={summary['count']} total={summary['total']:.4f}s {percentiles}{peak}")
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="per-stage solver benchmark")
+    parser.add_argument("--output",help="write the results as json")
+    parser.add_argument("--baseline",help="json results to compare against")
+    parser.add_argument("--threshold",type=float,default=0.25,help="allowed slowdown before failing (0.25 = 25%%)")
+    parser.add_argument("--metric",default="p50",help="summary value compared against the baseline")
+    parser.add_argument("--sample",type=int,default=1000,help="puzzles sampled from finnish.csv")
+    parser.add_argument("--seed",type=int,default=0)
+    parser.add_argument("--repeats",type=int,default=1)
+    parser.add_argument("--finnish",default="boards/finnish.csv")
+    parser.add_argument("--no-memory",action="store_true",help="skip the tracemalloc pass")
+    args = parser.parse_args(argv)
+
+    benchmark_sets = load_benchmark_sets(args.sample,args.seed,args.finnish)
+    results = run_benchmark(benchmark_sets,args.repeats,memory=not args.no_memory)
+    results["meta"]["seed"] = args.seed
+    print_results(results)
+
+    if args.output is not None:
+        with open(args.output,"w") as output_file:
+            json.dump(results,output_file,indent=2)
+
+    if args.baseline is not None:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = compare_to_baseline(results,baseline,args.threshold,args.metric)
+        for (name,stage,before,after) in regressions:
+            print(f"REGRESSION {name}/{stage}: {args.metric} {before*1e6:.1f}us -> {after*1e6:.1f}us")
+        if len(regressions) > 0:
+            return 1
+        print(f"No regressions over {args.threshold:.0%} against {args.baseline}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,136 @@
+import sys
+import time
+import argparse
+import numpy as np
+import suso
+
+# seeded puzzle generator: random full grids, then clues removed one at a time while the
+# puzzle stays unique. written as a "quizzes,solutions" csv like boards/sudoku_hard.csv.
+#   python generator.py --count 1000 --seed 1 --clues 26 --difficulty hidden_singles --output boards/generated.csv
+
+# what it takes to finish a puzzle, easiest first
+DIFFICULTIES = ["naked_singles","hidden_singles","search"]
+
+
+def random_full_grid(rng):
+    # the three diagonal boxes do not constrain each other, so they are filled at random and the
+    # search completes the grid. a random transposition and row/column ordering (within bands
+    # and stacks) then spreads the grids over the rest of the search space
+    values = np.zeros([81],dtype=np.uint8)
+    for box in [0,4,8]:
+        values[suso.UNITS[18 + box]] = rng.permutation(9) + 1
+    board = suso.BitmaskSudokuBoard()
+    board.initialize_board_from_string(suso.values_to_string(values))
+    (solution,search_stats) = suso.DepthFirstSolver().solve(board)
+    assert(solution is not None)
+    transform = (bool(rng.integers(2)),
+                 suso.LINE_PERMUTATIONS[rng.integers(1296)],
+                 suso.LINE_PERMUTATIONS[rng.integers(1296)],
+                 np.arange(10,dtype=np.uint8))
+    return suso.to_canonical(solution.cells,transform)
+
+class ClueRemover(suso.DepthFirstSolver):
+    # takes clues out of a full grid in random order, putting a clue back whenever the puzzle
+    # would stop being unique. the puzzle before each removal has the single solution, so the
+    # only question is "is there a solution with another value in this cell", one search that
+    # stops at the first hit. the clues are assigned once, last to be removed first, so the
+    # propagated state for the clues still untested is a mark on the trail: each removal undoes
+    # to it and only re-assigns the clues kept so far, instead of propagating every clue again
+
+    def remove_clues(self, solution, order, target_clues=None):
+        # returns the quiz as an (81,) uint8 array
+        self.reset(suso.BoardGeometry.for_box_size(3))
+        self.limit = 1
+        solution = [int(value) for value in np.asarray(solution).reshape([81])]
+        order = [int(cell) for cell in order]
+
+        # marks[k] is the trail with only the clues order[k+1:] assigned
+        marks = [0]*81
+        for k in reversed(range(81)):
+            marks[k] = len(self.trail)
+            assert(self.assign(order[k],solution[order[k]]))
+
+        kept = []
+        clues = 81
+        tested = 0
+        for cell in order:
+            if target_clues is not None and clues <= target_clues:
+                break
+            self.undo(marks[tested])
+            tested += 1
+            for kept_cell in kept:
+                self.assign(kept_cell,solution[kept_cell])
+            self.found = 0
+            self.first_solution = None
+            if self.eliminate(cell,solution[cell]) and self.search(0):
+                kept.append(cell)
+            else:
+                clues -= 1
+        self.undo(0)
+
+        quiz = np.zeros([81],dtype=np.uint8)
+        for cell in kept + order[tested:]:
+            quiz[cell] = solution[cell]
+        return quiz
+
+def remove_clues(solution, rng, target_clues=None, remover=None):
+    if remover is None:
+        remover = ClueRemover()
+    return remover.remove_clues(solution,rng.permutation(81),target_clues)
+
+def puzzle_difficulty(quiz):
+    board = suso.BitmaskSudokuBoard()
+    board.initialize_board_from_string(suso.values_to_string(quiz))
+    board.apply_constraints_iteratively()
+    if board.filled_cells() == 81:
+        return "naked_singles"
+    board.apply_constraints_iteratively(hidden_singles=True)
+    if board.filled_cells() == 81:
+        return "hidden_singles"
+    return "search"
+
+def generate_puzzles(count, seed=0, target_clues=None, difficulty=None, max_attempts=None):
+    # list of (quiz, solution) (81,) uint8 pairs. with target_clues only puzzles that get down to
+    # exactly that many clues are kept, and with difficulty only puzzles of that difficulty.
+    # the same arguments always give the same puzzles
+    assert(difficulty is None or difficulty in DIFFICULTIES)
+    rng = np.random.default_rng(seed)
+    remover = ClueRemover()
+    puzzles = []
+    attempts = 0
+    while len(puzzles) < count and (max_attempts is None or attempts < max_attempts):
+        attempts += 1
+        solution = random_full_grid(rng)
+        quiz = remove_clues(solution,rng,target_clues,remover)
+        if target_clues is not None and np.count_nonzero(quiz) != target_clues:
+            continue
+        if difficulty is not None and puzzle_difficulty(quiz) != difficulty:
+            continue
+        puzzles.append((quiz,solution))
+    return puzzles
+
+def write_puzzles(output_path, puzzles):
+    with open(output_path,"w") as output_file:
+        output_file.write("quizzes,solutions\n")
+        for (quiz,solution) in puzzles:
+            output_file.write(f"{suso.values_to_string(quiz)},{suso.values_to_string(solution)}\n")
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="seeded sudoku generator")
+    parser.add_argument("--count",type=int,default=100)
+    parser.add_argument("--seed",type=int,default=0)
+    parser.add_argument("--clues",type=int,help="keep only puzzles with exactly this many clues")
+    parser.add_argument("--difficulty",choices=DIFFICULTIES,help="keep only puzzles of this difficulty")
+    parser.add_argument("--max-attempts",type=int,help="give up after this many grids")
+    parser.add_argument("--output",default="boards/generated.csv")
+    args = parser.parse_args(argv)
+
+    start_time = time.time()
+    puzzles = generate_puzzles(args.count,args.seed,args.clues,args.difficulty,args.max_attempts)
+    elapsed = time.time() - start_time
+    write_puzzles(args.output,puzzles)
+    print(f"Wrote {len(puzzles)} puzzles to {args.output} in {elapsed:.2f} seconds ({len(puzzles)/elapsed:.2f} puzzles per second)")
+    return 0 if len(puzzles) == args.count else 1
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
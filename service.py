@@ -0,0 +1,206 @@
+import sys
+import time
+import asyncio
+import argparse
+import collections
+import numpy as np
+import suso
+
+# long running solver: puzzles arrive as 81 character lines on stdin or a unix socket, are
+# propagated in micro-batches with suso.solve_batch, and the answers go back one line per
+# request, in request order.
+#   python service.py < puzzles.txt
+#   python service.py --socket /tmp/suso.sock
+
+
+def solve_board_strings(board_strings, max_nodes=None):
+    # one response line per request: the 81 character solution, or "error: ..." for lines that
+    # are not puzzles and puzzles without a solution. propagation runs over the whole batch,
+    # and only the boards it leaves unfinished are searched one at a time
+    responses = [None]*len(board_strings)
+    puzzles = []
+    for (i,board_string) in enumerate(board_strings):
+        if len(board_string) != 81 or not board_string.isdigit() or not board_string.isascii():
+            responses[i] = "error: expected 81 digits"
+        else:
+            puzzles.append(i)
+    if len(puzzles) == 0:
+        return responses
+
+    quizzes = suso.quizzes_from_strings([board_strings[i] for i in puzzles])
+    (solved,iterations) = suso.solve_batch(quizzes)
+    (candidates,valid) = suso.batch_candidates(solved)
+    finished = valid & np.all(solved != 0,axis=1)
+    solution_strings = (solved + ord("0")).tobytes().decode("ascii")
+
+    for (j,i) in enumerate(puzzles):
+        if finished[j]:
+            responses[i] = solution_strings[j*81:(j+1)*81]
+            continue
+        if not valid[j]:
+            responses[i] = "error: no solution"
+            continue
+        # the search starts from what propagation already placed
+        board = suso.BitmaskSudokuBoard()
+        board.initialize_board_from_string(solution_strings[j*81:(j+1)*81])
+        (solution,search_stats) = suso.DepthFirstSolver(max_nodes=max_nodes).solve(board)
+        if solution is not None:
+            responses[i] = solution.print_board_string()
+        elif search_stats.budget_exhausted:
+            responses[i] = "error: search budget exhausted"
+        else:
+            responses[i] = "error: no solution"
+    return responses
+
+
+class SolverService:
+    # requests wait in a bounded queue (so a fast client is slowed down instead of growing
+    # memory), and the batcher solves whatever has arrived within max_delay, up to max_batch
+    def __init__(self, max_batch=256, max_delay=0.002, queue_size=4096, max_nodes=None, latency_window=100000):
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_nodes = max_nodes
+        self.requests = asyncio.Queue(queue_size)
+        # seconds from submit to answer, for the most recent requests only
+        self.latencies = collections.deque(maxlen=latency_window)
+        self.answered = 0
+        self.batches = 0
+        self.failed_batches = 0
+
+    async def submit(self, board_string):
+        # returns a future for the response line
+        future = asyncio.get_running_loop().create_future()
+        await self.requests.put((board_string,future,time.perf_counter()))
+        return future
+
+    def take_waiting(self, batch):
+        while len(batch) < self.max_batch and not self.requests.empty():
+            batch.append(self.requests.get_nowait())
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.requests.get()]
+            self.take_waiting(batch)
+            if len(batch) < self.max_batch and self.max_delay > 0:
+                await asyncio.sleep(self.max_delay)
+                self.take_waiting(batch)
+
+            # solved off the event loop, so requests keep being read while a batch runs. a batch
+            # that fails is answered with the error, and the batcher goes on with the next one
+            try:
+                responses = await loop.run_in_executor(None,solve_board_strings,[board_string for (board_string,future,start) in batch],self.max_nodes)
+            except Exception as error:
+                responses = [f"error: {type(error).__name__}: {error}"]*len(batch)
+                self.failed_batches += 1
+            end = time.perf_counter()
+            for ((board_string,future,start),response) in zip(batch,responses):
+                self.latencies.append(end - start)
+                if not future.cancelled():
+                    future.set_result(response)
+            self.answered += len(batch)
+            self.batches += 1
+
+    def latency_summary(self):
+        if len(self.latencies) == 0:
+            return {"count": 0}
+        latencies = np.array(self.latencies)
+        return {"count": len(latencies),
+                "p50": float(np.percentile(latencies,50)),
+                "p99": float(np.percentile(latencies,99))}
+
+    def report(self):
+        summary = self.latency_summary()
+        if summary["count"] == 0:
+            return "no requests answered"
+        return (f"{self.answered} requests in {self.batches} batches ({self.answered/self.batches:.1f} per batch), "
+                f"latency p50={summary['p50']*1e3:.2f}ms p99={summary['p99']*1e3:.2f}ms")
+
+
+async def serve_stream(service, reader, writer, pending_size=1024):
+    # answer every line from reader on writer in the order the lines came in. at most
+    # pending_size answers are outstanding before reading pauses
+    pending = asyncio.Queue(pending_size)
+
+    async def read_requests():
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            board_string = line.decode("ascii","replace").strip()
+            if board_string == "":
+                continue
+            await pending.put(await service.submit(board_string))
+        await pending.put(None)
+
+    reading = asyncio.create_task(read_requests())
+    while True:
+        future = await pending.get()
+        if future is None:
+            break
+        writer.write((await future + "\n").encode("ascii"))
+        if pending.empty():
+            await writer.drain()
+    await writer.drain()
+    await reading
+
+
+class StdioStream:
+    # readline/write/drain over stdin and stdout, which may be files as well as pipes
+    async def readline(self):
+        return await asyncio.get_running_loop().run_in_executor(None,sys.stdin.buffer.readline)
+
+    def write(self, data):
+        sys.stdout.buffer.write(data)
+
+    async def drain(self):
+        sys.stdout.buffer.flush()
+
+async def serve_connection(service, reader, writer):
+    try:
+        await serve_stream(service,reader,writer)
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+async def report_periodically(service, seconds):
+    while True:
+        await asyncio.sleep(seconds)
+        print(service.report(),file=sys.stderr)
+
+async def run_service(socket_path=None, max_batch=256, max_delay=0.002, queue_size=4096, max_nodes=None, report_every=None):
+    service = SolverService(max_batch,max_delay,queue_size,max_nodes)
+    tasks = [asyncio.create_task(service.run())]
+    if report_every is not None:
+        tasks.append(asyncio.create_task(report_periodically(service,report_every)))
+    try:
+        if socket_path is None:
+            stream = StdioStream()
+            await serve_stream(service,stream,stream)
+        else:
+            server = await asyncio.start_unix_server(lambda reader, writer: serve_connection(service,reader,writer),path=socket_path)
+            async with server:
+                await server.serve_forever()
+    finally:
+        for task in tasks:
+            task.cancel()
+        print(service.report(),file=sys.stderr)
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="streaming sudoku solver")
+    parser.add_argument("--socket",help="listen on this unix socket instead of stdin/stdout")
+    parser.add_argument("--max-batch",type=int,default=256,help="most puzzles propagated together")
+    parser.add_argument("--max-delay",type=float,default=0.002,help="seconds to wait for a batch to fill")
+    parser.add_argument("--queue-size",type=int,default=4096,help="requests waiting before clients are slowed down")
+    parser.add_argument("--max-nodes",type=int,help="search budget for puzzles propagation cannot finish")
+    parser.add_argument("--report-every",type=float,help="print the latency report every this many seconds")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(run_service(args.socket,args.max_batch,args.max_delay,args.queue_size,args.max_nodes,args.report_every))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -1,10 +1,168 @@
 import sys
-import copy
+import os
+import mmap
+import multiprocessing
 import numpy as np
 import hashlib
 import time
+import collections
+import json
+import itertools
 
 
+# lookup tables for the bitmask representation (bit value-1 set means value is possible)
+ALL_CANDIDATES = 0x1FF
+POPCOUNT = np.array([bin(mask).count("1") for mask in range(512)],dtype=np.uint8)
+MASK_TO_VALUE = np.zeros([512],dtype=np.uint8)
+for value in range(1,10):
+    MASK_TO_VALUE[1 << (value-1)] = value
+# value -> bit (value 0 is an empty cell, which contributes no bit)
+VALUE_TO_BIT = np.array([0] + [1 << (value-1) for value in range(1,10)],dtype=np.uint16)
+CELL_ROW = np.arange(81) // 9
+CELL_COL = np.arange(81) % 9
+CELL_BOX = (CELL_ROW // 3)*3 + (CELL_COL // 3)
+
+# the 27 units (9 rows, 9 columns, 9 boxes) as cell indices, the 3 units of every cell,
+# and the 20 peers of every cell (the cells sharing a unit with it)
+UNITS = np.array([np.flatnonzero(CELL_ROW == row) for row in range(9)] +
+                 [np.flatnonzero(CELL_COL == col) for col in range(9)] +
+                 [np.flatnonzero(CELL_BOX == box) for box in range(9)])
+CELL_UNITS = np.stack([CELL_ROW,9 + CELL_COL,18 + CELL_BOX],axis=1)
+PEERS = np.array([np.setdiff1d(np.unique(UNITS[CELL_UNITS[cell]]),[cell]) for cell in range(81)])
+assert(PEERS.shape == (81,20))
+
+# board strings beyond 9x9: "0" is empty, then 1-9 and letters (A is 10, so 16x16 ends at G and 25x25 at P)
+BOARD_CHARACTERS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+BOARD_CHARACTER_BYTES = np.frombuffer(BOARD_CHARACTERS.encode("ascii"),dtype=np.uint8)
+CHARACTER_VALUES = np.zeros([256],dtype=np.uint8)
+for value, character in enumerate(BOARD_CHARACTERS):
+    CHARACTER_VALUES[ord(character)] = value
+    CHARACTER_VALUES[ord(character.lower())] = value
+# set bits in every 16 bit chunk, for candidate masks wider than POPCOUNT covers
+POPCOUNT16 = np.zeros([1 << 16],dtype=np.uint8)
+for bit in range(16):
+    POPCOUNT16 += ((np.arange(1 << 16) >> bit) & 1).astype(np.uint8)
+
+
+class SolverStats:
+    # instrumentation hooks. this default does nothing, so the solver pays one method call per hook;
+    # anything costlier than that is guarded with "if solver_stats.enabled"
+    enabled = False
+
+    def count(self, name, amount=1):
+        pass
+
+    def observe(self, name, value):
+        pass
+
+    def phase(self, name):
+        return NO_PHASE
+
+    def trace(self, event, **details):
+        pass
+
+
+class NoPhase:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+NO_PHASE = NoPhase()
+
+
+class PhaseTimer:
+    def __init__(self, sink, name):
+        self.sink = sink
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.sink.add_phase_time(self.name,time.perf_counter() - self.start)
+        return False
+
+
+class AggregatingSolverStats(SolverStats):
+    # collects counters, value histograms and wall time per phase, for one board or a whole run.
+    # trace_hook(event, details) optionally sees every trace event as it happens
+    enabled = True
+
+    def __init__(self, trace_hook=None):
+        self.counters = {}
+        self.histograms = {}
+        self.phase_times = {}
+        self.phase_calls = {}
+        self.trace_hook = trace_hook
+
+    def count(self, name, amount=1):
+        self.counters[name] = self.counters.get(name,0) + amount
+
+    def observe(self, name, value):
+        histogram = self.histograms.setdefault(name,{})
+        histogram[value] = histogram.get(value,0) + 1
+
+    def phase(self, name):
+        return PhaseTimer(self,name)
+
+    def add_phase_time(self, name, seconds):
+        self.phase_times[name] = self.phase_times.get(name,0.0) + seconds
+        self.phase_calls[name] = self.phase_calls.get(name,0) + 1
+
+    def trace(self, event, **details):
+        if self.trace_hook is not None:
+            self.trace_hook(event,details)
+
+    def merge(self, other):
+        for name, amount in other.counters.items():
+            self.count(name,amount)
+        for name, histogram in other.histograms.items():
+            for value, occurrences in histogram.items():
+                merged = self.histograms.setdefault(name,{})
+                merged[value] = merged.get(value,0) + occurrences
+        for name, seconds in other.phase_times.items():
+            self.phase_times[name] = self.phase_times.get(name,0.0) + seconds
+            self.phase_calls[name] = self.phase_calls.get(name,0) + other.phase_calls[name]
+
+    def report(self):
+        lines = ["Counters:"]
+        for name in sorted(self.counters):
+            lines.append(f"\t{name}: {self.counters[name]}")
+        lines.append("Histograms:")
+        for name in sorted(self.histograms):
+            lines.append(f"\t{name}: {dict(sorted(self.histograms[name].items()))}")
+        lines.append("Phases:")
+        for name in sorted(self.phase_times):
+            lines.append(f"\t{name}: {self.phase_times[name]:.4f} seconds in {self.phase_calls[name]} calls")
+        return "\n".join(lines)
+
+
+solver_stats = SolverStats()
+
+def set_solver_stats(sink):
+    # install a stats sink (None restores the no-op default), returning the previous one
+    global solver_stats
+    previous = solver_stats
+    solver_stats = sink if sink is not None else SolverStats()
+    return previous
+
+def board_nbytes(board):
+    # the array storage a board carries, for the bytes_allocated counter. views into one
+    # buffer (as in BitmaskSudokuBoard) count the buffer once
+    if hasattr(board,"__dict__"):
+        values = vars(board).values()
+    else:
+        values = [getattr(board,name) for name in board.__slots__]
+    arrays = {}
+    for value in values:
+        if isinstance(value,np.ndarray):
+            base = value if value.base is None else value.base
+            arrays[id(base)] = base.nbytes
+    return sum(arrays.values())
+
 
 class SudokuBoard:
     # class variables up here
@@ -41,16 +199,39 @@ class SudokuBoard:
                 mask[super_row*3:(super_row+1)*3,super_col*3:(super_col+1)*3,stack] = 1
                 assert(mask.sum() == 9)
                 masks.append(mask)
+    # the same 324 masks stacked into one (constraint, possibility) matrix
+    constraint_matrix = np.array(masks,dtype=np.uint8).reshape([324,729])
+    # which cells each constraint touches
+    constraint_cells = np.any(constraint_matrix.reshape([324,81,9]),axis=2)
 
     def __init__(self):
         self.known_values = np.zeros([9,9],"L")
         self._creation_hash = ""
+        self.refresh_possibilities()
 
     def initialize_board_from_string(self,input_string):
         for row in range(9):
             for col in range(9):
                 value = int(input_string[row*9+col])
                 self.known_values[row][col] = value
+        self.refresh_possibilities()
+
+    # the possibilities are kept live: apply_known_value updates them for the peers of the cell,
+    # and dirty marks the cells whose possibilities changed since the last constraint pass
+    # (hidden_dirty since the last pass that looked for hidden singles)
+    def refresh_possibilities(self):
+        solver_stats.count("possibility_rebuilds")
+        self._possibilities = SudokuBoard.convert_known_values_to_possibilities(self.known_values)
+        self._possibilities_known_values = self.known_values.copy()
+        self.dirty = np.ones([81],dtype=bool)
+        self.hidden_dirty = np.ones([81],dtype=bool)
+
+    @property
+    def possibilities(self):
+        # known_values is public, so rebuild if it was changed behind our back
+        if not np.array_equal(self._possibilities_known_values,self.known_values):
+            self.refresh_possibilities()
+        return self._possibilities
 
     def format_guess(guess):
         return f"[({guess[0]},{guess[1]})=={guess[2]}]"
@@ -68,11 +249,11 @@ class SudokuBoard:
         return grid_string
     
     def print_board_string(self):
-        return_string = ""
-        for row in range(9):
-            for col in range(9):
-                return_string += str(self.known_values[row][col])
-        return return_string
+        return (self.known_values.reshape([81]).astype(np.uint8) + ord("0")).tobytes().decode("ascii")
+
+    def canonical_form(self):
+        # (canonical values, transform) shared by every symmetric copy of this board
+        return canonical_form(self.known_values)
 
     def print_possibilities(possibilities):
         # +---+---+
@@ -125,12 +306,36 @@ class SudokuBoard:
 
     def valid(self):
         # a board is valid if there are non-zero possibilities for all cells.
-        possibilities = SudokuBoard.convert_known_values_to_possibilities(self.known_values)
+        possibilities = self.possibilities
         possibility_counts = np.sum(possibilities,axis=2)
         minimum_possibilities = np.min(possibility_counts)
         return (minimum_possibilities != 0)
     
 
+    def clone(self):
+        # explicit copy of the arrays, much cheaper than copy.deepcopy
+        board_copy = SudokuBoard.__new__(type(self))
+        board_copy.known_values = self.known_values.copy()
+        board_copy._creation_hash = self._creation_hash
+        board_copy._possibilities = self._possibilities.copy()
+        board_copy._possibilities_known_values = self._possibilities_known_values.copy()
+        board_copy.dirty = self.dirty.copy()
+        board_copy.hidden_dirty = self.hidden_dirty.copy()
+        return board_copy
+
+    def contradicted(self):
+        # stronger than valid(): also catches a value with no cell left in some row, column or
+        # box. a value given twice in a unit leaves the earlier cell without possibilities
+        # (see convert_known_values_to_possibilities), so valid() already sees that one
+        possibilities = self.possibilities.reshape([81,9]) != 0
+        return not (np.all(np.any(possibilities,axis=1)) and np.all(np.any(possibilities[UNITS],axis=1)))
+
+    def count_solutions(self, limit=2, max_nodes=None):
+        # number of solutions, counting stops at limit: count_solutions() == 1 means unique.
+        # BUDGET_EXHAUSTED if max_nodes ran out before the count was settled
+        (found,search_stats) = DepthFirstSolver(max_nodes=max_nodes).count_solutions(self,limit)
+        return BUDGET_EXHAUSTED if search_stats.budget_exhausted else found
+
     def guess(self, guess_index):
         # simplest thing that could possibly work: 
         # 1/iterate, row, column, stack.
@@ -144,7 +349,10 @@ class SudokuBoard:
                     if self.possibilities[row,col,stack] == 1:
                         if guess_counter == guess_index:
                             # make a copy
-                            board_copy = copy.deepcopy(self)
+                            board_copy = self.clone()
+                            solver_stats.count("clones")
+                            if solver_stats.enabled:
+                                solver_stats.count("bytes_allocated",board_nbytes(board_copy))
                             # apply the guess (turning the "possibility" into known)
                             board_copy.apply_known_value(row,col,stack+1)
                             return (board_copy,(row,col,stack+1))
@@ -178,9 +386,29 @@ class SudokuBoard:
         #     sys.exit(1)
         
         # step 5B - replace the "one" value in the correct cell
+        possibilities = self.possibilities
+        cell = row*9 + col
+        peers = PEERS[cell]
+        previous = self.known_values[row,col]
         self.known_values[row,col] = value
+        self._possibilities_known_values[row,col] = value
+
+        # step 5C - update the possibilities of the cell and its peers. overwrites and
+        # duplicated values fall back to a rebuild, to keep the row-major rules of
+        # convert_known_values_to_possibilities
+        if previous != 0 or np.any(self.known_values.reshape([81])[peers] == value):
+            self.refresh_possibilities()
+        else:
+            flat_possibilities = possibilities.reshape([81,9])
+            flat_possibilities[peers,value-1] = False
+            flat_possibilities[cell,:] = False
+            flat_possibilities[cell,value-1] = True
+            self.dirty[cell] = True
+            self.dirty[peers] = True
+            self.hidden_dirty[cell] = True
+            self.hidden_dirty[peers] = True
 
-        # step 5C - postcheck the board
+        # step 5D - postcheck the board
         #if SudokuBoard.check_board_array(self.known_values) == False:
         #    print(f"INFO: Post-application board is invalid when setting [({row},{col}) = {value}]")
 
@@ -233,44 +461,112 @@ class SudokuBoard:
         return known_values
     
     def convert_known_values_to_possibilities(known_values):
-        # create the possibilities grid
-        confirmed_possibilities = np.ones([9,9,9],dtype=bool)
+        # same result as calling apply_known_cell_to_possibilities on every known cell in
+        # row-major order, done with the PEERS table instead of a loop over the cells
+        values = np.asarray(known_values).reshape([81]).astype(np.intp)
+        known_cells = np.flatnonzero(values)
+        known_stacks = values[known_cells] - 1
+        peer_cells = PEERS[known_cells]
 
-        # apply each known value
-        for row in range(9):
-            for col in range(9):
-                value = known_values[row][col]
-                if value != 0:
-                    SudokuBoard.apply_known_cell_to_possibilities(row,col,int(value),confirmed_possibilities)
+        # create the possibilities grid and clear every known value out of its peers
+        confirmed_possibilities = np.ones([81,9],dtype=bool)
+        confirmed_possibilities[peer_cells,known_stacks.reshape([-1,1])] = False
+
+        # known cells keep only their own value, unless a later peer (in row-major order)
+        # holds the same value, which clears it again
+        confirmed_possibilities[known_cells,:] = False
+        same_value = (values[peer_cells] == values[known_cells].reshape([-1,1]))
+        later_peer = (peer_cells > known_cells.reshape([-1,1]))
+        kept = ~np.any(same_value & later_peer,axis=1)
+        confirmed_possibilities[known_cells[kept],known_stacks[kept]] = True
+
+        return confirmed_possibilities.reshape([9,9,9])
+
+    def convert_possibilities_to_hidden_singles(possibilities, constraints=None):
+        # constraints optionally limits the search to some of the 324 constraint rows
+        assert(possibilities.shape == (9,9,9))
+        flat_possibilities = possibilities.reshape([729]).astype(np.uint8)
+        constraint_matrix = SudokuBoard.constraint_matrix
+        if constraints is not None:
+            constraint_matrix = constraint_matrix[constraints]
 
-        return confirmed_possibilities
+        # count the possibilities left in every row, column, cell and neighborhood constraint
+        constraint_counts = constraint_matrix @ flat_possibilities
 
-    def find_implied_cells(known_values):
+        # the single remaining possibility of each constraint with a count of one must be true
+        single_constraints = constraint_matrix[constraint_counts == 1]
+        hidden_singles = np.any(single_constraints & flat_possibilities,axis=0).reshape([9,9,9])
+
+        # a cell forced to two values is a contradiction; leave it for valid() to find
+        forced_cells = (np.sum(hidden_singles,axis=2) == 1)
+        known_values = (np.argmax(hidden_singles,axis=2) + 1) * forced_cells
+        return known_values.astype(np.uint)
+
+    def find_implied_cells(known_values, hidden_singles=False):
         confirmed_possibilities = SudokuBoard.convert_known_values_to_possibilities(known_values)    
         known_and_implied_values = SudokuBoard.convert_possibilities_to_known_values(confirmed_possibilities)
+        if hidden_singles:
+            hidden_values = SudokuBoard.convert_possibilities_to_hidden_singles(confirmed_possibilities)
+            known_and_implied_values = np.where(known_and_implied_values == 0, hidden_values, known_and_implied_values)
         return known_and_implied_values
 
-    def apply_constraints_iteratively(self):
+    def apply_implied_cells(self, hidden_singles=False):
+        # one pass of find_implied_cells on the live possibilities. only the dirty cells (and
+        # the constraints touching them) can have become singles since the last pass
+        possibilities = self.possibilities
+        dirty_cells = np.flatnonzero(self.dirty)
+        self.dirty[:] = False
+
+        flat_possibilities = possibilities.reshape([81,9])
+        empty = (self.known_values.reshape([81])[dirty_cells] == 0)
+        singles = dirty_cells[empty & (np.sum(flat_possibilities[dirty_cells],axis=1) == 1)]
+        implied = [(cell,int(np.argmax(flat_possibilities[cell])) + 1) for cell in singles]
+
+        if hidden_singles:
+            hidden_dirty_cells = np.flatnonzero(self.hidden_dirty)
+            self.hidden_dirty[:] = False
+            constraints = np.flatnonzero(np.any(SudokuBoard.constraint_cells[:,hidden_dirty_cells],axis=1))
+            hidden_values = SudokuBoard.convert_possibilities_to_hidden_singles(possibilities,constraints).reshape([81])
+            naked_cells = set(singles.tolist())
+            for cell in np.flatnonzero((self.known_values.reshape([81]) == 0) & (hidden_values != 0)):
+                if cell not in naked_cells:
+                    implied.append((cell,int(hidden_values[cell])))
+
+        # all singles come from the same snapshot, like find_implied_cells
+        for (cell,value) in implied:
+            self.apply_known_value(int(cell) // 9,int(cell) % 9,value)
+        solver_stats.count("cells_fixed.naked_single",len(singles))
+        solver_stats.count("cells_fixed.hidden_single",len(implied) - len(singles))
+        return len(implied)
+
+    def apply_strategies(self, strategies):
+        # the chain past the singles (see strategy_deductions), placing the cells it forces
+        (cells,values) = strategy_deductions(self.possibilities.reshape([81,9]) != 0,self.known_values,BoardGeometry.for_box_size(3),strategies)
+        for (cell,value) in zip(cells,values):
+            self.apply_known_value(int(cell) // 9,int(cell) % 9,int(value))
+        return len(cells)
+
+    def apply_constraints_iteratively(self, hidden_singles=False, strategies=None):
+        # strategies (names from STRATEGY_CHAIN) only run once the singles stop making progress
+        strategies = strategy_chain(hidden_singles,strategies)
         starting = 0
         ending = 81
         iterations = 0
-        while (starting < ending) and (self.valid()):
+        while (starting < ending) and not self.contradicted():
             starting = self.filled_cells()
-            self.known_values = SudokuBoard.find_implied_cells(self.known_values)
+            self.apply_implied_cells("hidden_single" in strategies)
+            if self.filled_cells() == starting and strategies[-1] in STRATEGIES:
+                self.apply_strategies(strategies)
             iterations += 1
             ending = self.filled_cells()
+            solver_stats.count("propagation_passes")
+            solver_stats.observe("cells_fixed_per_pass",int(ending - starting))
+            solver_stats.trace("pass",board=self,iteration=iterations,fixed=ending - starting)
         return iterations
     
     def check_solution_string(self,solution_string):
-        for row in range(9):
-            for col in range(9):
-                solution_value = int(solution_string[row*9+col])
-                board_value = self.known_values[row][col]
-                if board_value != 0:
-                    if board_value != solution_value:
-                        assert(0)
-                        return False
-        return True
+        # True when every filled cell agrees with the solution (see verify_solutions)
+        return not verify_solutions(self.known_values.reshape([81]),quizzes_from_strings([solution_string])).mismatched[0]
                  
     def convert_possibilities_to_guesses(possibilities):
         # mask out all possibilities where the sum in a stack is 1
@@ -293,14 +589,630 @@ class SudokuBoard:
         return guesses
     
     def guesses(self):
-        possibilities = SudokuBoard.convert_known_values_to_possibilities(self.known_values)
-        current_guesses = SudokuBoard.convert_possibilities_to_guesses(possibilities)
+        current_guesses = SudokuBoard.convert_possibilities_to_guesses(self.possibilities)
         return current_guesses
-                    
-class SudokuGuesser:
+
+
+class BitmaskSudokuBoard:
+    # same public surface as SudokuBoard, but the candidates are one 9-bit mask per cell
+    # plus row/column/box occupancy masks, instead of a 9x9x9 possibilities cube.
+    # everything lives in one 135 byte buffer: 27 uint16 occupancy masks, then 81 uint8 cells,
+    # and the fields are views into it, so clone() copies a single small array
+    __slots__ = ("buffer","cells","row_used","col_used","box_used","_creation_hash")
+    BUFFER_BYTES = 27*2 + 81
+
     def __init__(self):
-        self.boards = {}
-        self.board_graph = {}
+        self.attach_buffer(np.zeros([BitmaskSudokuBoard.BUFFER_BYTES],dtype=np.uint8))
+        self._creation_hash = ""
+
+    def attach_buffer(self, buffer):
+        self.buffer = buffer
+        used = buffer[0:54].view(np.uint16)
+        self.row_used = used[0:9]
+        self.col_used = used[9:18]
+        self.box_used = used[18:27]
+        self.cells = buffer[54:]
+
+    def clone(self):
+        board_copy = BitmaskSudokuBoard.__new__(type(self))
+        board_copy.attach_buffer(self.buffer.copy())
+        board_copy._creation_hash = self._creation_hash
+        return board_copy
+
+    @property
+    def known_values(self):
+        return self.cells.reshape([9,9])
+
+    def initialize_board_from_string(self,input_string):
+        self.cells[:] = np.frombuffer(input_string[0:81].encode("ascii"),dtype=np.uint8) - ord("0")
+        self.refresh_occupancy()
+
+    def refresh_occupancy(self):
+        # written in place, the masks are views into the board buffer
+        bits = VALUE_TO_BIT[self.cells]
+        self.row_used[:] = np.bitwise_or.reduce(bits.reshape([9,9]),axis=1)
+        self.col_used[:] = np.bitwise_or.reduce(bits.reshape([9,9]),axis=0)
+        self.box_used[:] = np.bitwise_or.reduce(bits.reshape([3,3,3,3]).transpose([0,2,1,3]).reshape([9,9]),axis=1)
+
+    def candidates(self):
+        # empty cells get everything their row, column and box have not used; filled cells get their own bit
+        blocked = self.row_used[CELL_ROW] | self.col_used[CELL_COL] | self.box_used[CELL_BOX]
+        return np.where(self.cells == 0, ~blocked & ALL_CANDIDATES, VALUE_TO_BIT[self.cells]).astype(np.uint16)
+
+    def get_board(self):
+        return self.known_values
+
+    def print_board_string(self):
+        return (self.cells + ord("0")).tobytes().decode("ascii")
+
+    def canonical_form(self):
+        return canonical_form(self.cells)
+
+    def filled_cells(self):
+        return np.count_nonzero(self.cells)
+
+    def unfilled_cells(self):
+        return 81 - self.filled_cells()
+
+    def mark_creation_hash(self):
+        self._creation_hash = hashlib.sha256(self.known_values.astype("L").tobytes(), usedforsecurity=False).hexdigest()[0:8]
+
+    def creation_hash(self):
+        return self._creation_hash
+
+    def duplicated(self):
+        # some unit holds a value twice: it has fewer occupancy bits than filled cells
+        filled = (self.cells != 0).reshape([9,9])
+        if np.any(POPCOUNT[self.row_used] != np.sum(filled,axis=1)):
+            return True
+        if np.any(POPCOUNT[self.col_used] != np.sum(filled,axis=0)):
+            return True
+        box_filled = filled.reshape([3,3,3,3]).transpose([0,2,1,3]).reshape([9,9])
+        return bool(np.any(POPCOUNT[self.box_used] != np.sum(box_filled,axis=1)))
+
+    def valid(self):
+        # a board is valid if every empty cell has a candidate and no unit holds a value twice
+        return not self.duplicated() and bool(np.all(self.candidates() != 0))
+
+    def contradicted(self):
+        # the unit_contradictions checks on the masks: a duplicate, an empty cell without
+        # candidates, or a value no cell of some unit can take
+        if self.duplicated():
+            return True
+        candidates = self.candidates()
+        return bool(np.any(candidates == 0) or np.any(np.bitwise_or.reduce(candidates[UNITS],axis=1) != ALL_CANDIDATES))
+
+    def count_solutions(self, limit=2, max_nodes=None):
+        (found,search_stats) = DepthFirstSolver(max_nodes=max_nodes).count_solutions(self,limit)
+        return BUDGET_EXHAUSTED if search_stats.budget_exhausted else found
+
+    def guesses(self):
+        candidates = self.candidates()
+        current_guesses = []
+        for cell in np.flatnonzero(POPCOUNT[candidates] > 1):
+            mask = int(candidates[cell])
+            for value in range(1,10):
+                if mask & (1 << (value-1)):
+                    current_guesses.append((int(cell) // 9,int(cell) % 9,value))
+        return current_guesses
+
+    # mutating function all below here
+    def apply_known_value(self, row, col, value):
+        assert(type(value) == type(1))
+        assert(row < 9)
+        assert(col < 9)
+        assert(value <= 9)
+        assert(value >= 1)
+
+        cell = row*9 + col
+        if self.cells[cell] != 0:
+            # overwriting a value means its bit has to come out of the occupancy masks
+            self.cells[cell] = value
+            self.refresh_occupancy()
+            return
+        bit = VALUE_TO_BIT[value]
+        self.cells[cell] = value
+        self.row_used[CELL_ROW[cell]] |= bit
+        self.col_used[CELL_COL[cell]] |= bit
+        self.box_used[CELL_BOX[cell]] |= bit
+
+    def apply_known_cells(self, cells, values):
+        # bulk version of apply_known_value for empty cells (flat indices)
+        bits = VALUE_TO_BIT[values]
+        self.cells[cells] = values
+        np.bitwise_or.at(self.row_used,CELL_ROW[cells],bits)
+        np.bitwise_or.at(self.col_used,CELL_COL[cells],bits)
+        np.bitwise_or.at(self.box_used,CELL_BOX[cells],bits)
+
+    def apply_naked_singles(self):
+        candidates = self.candidates()
+        singles = np.flatnonzero((self.cells == 0) & (POPCOUNT[candidates] == 1))
+        if len(singles) == 0:
+            return 0
+        self.apply_known_cells(singles,MASK_TO_VALUE[candidates[singles]])
+        return len(singles)
+
+    def hidden_single_values(self, candidates):
+        # expand the masks into the 729 possibilities and reuse the 324 constraint matrix
+        possibilities = ((candidates.reshape([81,1]) >> np.arange(9,dtype=np.uint16)) & 1).astype(np.uint8).reshape([9,9,9])
+        return SudokuBoard.convert_possibilities_to_hidden_singles(possibilities).reshape([81]).astype(np.uint8)
+
+    def apply_hidden_singles(self):
+        hidden_values = self.hidden_single_values(self.candidates())
+        singles = np.flatnonzero((self.cells == 0) & (hidden_values != 0))
+        self.apply_known_cells(singles,hidden_values[singles])
+        return len(singles)
+
+    def apply_singles(self, hidden_singles=False):
+        # one pass of SudokuBoard.apply_implied_cells: naked and hidden singles both come from one
+        # candidates() snapshot, and a cell that is a naked single keeps its naked value
+        candidates = self.candidates()
+        naked = (self.cells == 0) & (POPCOUNT[candidates] == 1)
+        values = np.where(naked,MASK_TO_VALUE[candidates],0).astype(np.uint8)
+        hidden = np.zeros([81],dtype=bool)
+        if hidden_singles:
+            hidden_values = self.hidden_single_values(candidates)
+            hidden = (self.cells == 0) & ~naked & (hidden_values != 0)
+            values[hidden] = hidden_values[hidden]
+        singles = np.flatnonzero(values)
+        self.apply_known_cells(singles,values[singles])
+        solver_stats.count("cells_fixed.naked_single",int(np.count_nonzero(naked)))
+        solver_stats.count("cells_fixed.hidden_single",int(np.count_nonzero(hidden)))
+        return len(singles)
+
+    def apply_strategies(self, strategies):
+        (cells,values) = strategy_deductions(candidate_cube(self.candidates(),9),self.cells,BoardGeometry.for_box_size(3),strategies)
+        self.apply_known_cells(cells,values)
+        return len(cells)
+
+    def apply_constraints_iteratively(self, hidden_singles=False, strategies=None):
+        # same pass counting as SudokuBoard.apply_constraints_iteratively
+        strategies = strategy_chain(hidden_singles,strategies)
+        starting = 0
+        ending = 81
+        iterations = 0
+        while (starting < ending) and not self.contradicted():
+            starting = self.filled_cells()
+            self.apply_singles("hidden_single" in strategies)
+            if self.filled_cells() == starting and strategies[-1] in STRATEGIES:
+                self.apply_strategies(strategies)
+            iterations += 1
+            ending = self.filled_cells()
+            solver_stats.count("propagation_passes")
+            solver_stats.observe("cells_fixed_per_pass",int(ending - starting))
+            solver_stats.trace("pass",board=self,iteration=iterations,fixed=ending - starting)
+        return iterations
+
+    def check_solution_string(self,solution_string):
+        return not verify_solutions(self.cells,quizzes_from_strings([solution_string])).mismatched[0]
+
+
+def mask_popcount(masks):
+    # set bits of unsigned masks of any width
+    masks = np.asarray(masks)
+    counts = np.zeros(masks.shape,dtype=np.uint8)
+    for shift in range(0,masks.dtype.itemsize*8,16):
+        counts += POPCOUNT16[(masks >> shift) & 0xFFFF]
+    return counts
+
+def mask_values(masks):
+    # value of single bit masks (bit value-1 set), 0 for an empty mask
+    return np.frexp(np.asarray(masks,dtype=np.float64))[1].astype(np.uint8)
+
+
+class BoardGeometry:
+    # index tables for a board of box_size x box_size boxes (size = box_size**2 values), with
+    # cells as flat row major indices. the constraints are kept sparse: the (3*size,size) table of
+    # unit cells, the 3 units of each cell and the peers of each cell, instead of size**3 masks
+    geometries = {}
+
+    def for_box_size(box_size):
+        if box_size not in BoardGeometry.geometries:
+            BoardGeometry.geometries[box_size] = BoardGeometry(box_size)
+        return BoardGeometry.geometries[box_size]
+
+    def __init__(self, box_size):
+        size = box_size*box_size
+        assert(size < len(BOARD_CHARACTERS))
+        self.box_size = box_size
+        self.size = size
+        self.cell_count = size*size
+        cells = np.arange(self.cell_count)
+        self.cell_row = cells // size
+        self.cell_col = cells % size
+        self.cell_box = (self.cell_row // box_size)*box_size + (self.cell_col // box_size)
+        self.units = np.array([np.flatnonzero(self.cell_row == row) for row in range(size)] +
+                              [np.flatnonzero(self.cell_col == col) for col in range(size)] +
+                              [np.flatnonzero(self.cell_box == box) for box in range(size)])
+        self.cell_units = np.stack([self.cell_row,size + self.cell_col,2*size + self.cell_box],axis=1)
+        self.peers = np.array([np.setdiff1d(np.unique(self.units[self.cell_units[cell]]),[cell]) for cell in range(self.cell_count)])
+        # every box/line intersection (box_size cells), with the rest of its line and the rest of its box
+        segments = []
+        for line in range(2*size):
+            for box in range(size):
+                segment = np.intersect1d(self.units[line],self.units[2*size + box])
+                if len(segment) > 0:
+                    segments.append((segment,np.setdiff1d(self.units[line],segment),np.setdiff1d(self.units[2*size + box],segment)))
+        self.segments = np.array([segment for (segment,line_rest,box_rest) in segments])
+        self.segment_line_rest = np.array([line_rest for (segment,line_rest,box_rest) in segments])
+        self.segment_box_rest = np.array([box_rest for (segment,line_rest,box_rest) in segments])
+        # the narrowest word that holds one bit per value
+        if size <= 16:
+            self.mask_dtype = np.uint16
+        elif size <= 32:
+            self.mask_dtype = np.uint32
+        else:
+            self.mask_dtype = np.uint64
+        self.all_candidates = self.mask_dtype((1 << size) - 1)
+        self.value_to_bit = np.array([0] + [1 << (value-1) for value in range(1,size+1)],dtype=self.mask_dtype)
+
+
+# logical strategies past the singles. each works on a (cells,size) bool candidate cube and
+# returns the candidates it rules out, and the chain runs them cheapest first
+
+def locked_candidates(candidates, geometry):
+    # pointing: a value that only fits the cells a box shares with one line comes out of the
+    # rest of that line. claiming: the same with the box and the line swapped
+    in_segment = np.any(candidates[geometry.segments],axis=1)
+    in_line_rest = np.any(candidates[geometry.segment_line_rest],axis=1)
+    in_box_rest = np.any(candidates[geometry.segment_box_rest],axis=1)
+    eliminated = np.zeros_like(candidates)
+    np.logical_or.at(eliminated,geometry.segment_line_rest,(in_segment & ~in_box_rest)[:,np.newaxis,:] & candidates[geometry.segment_line_rest])
+    np.logical_or.at(eliminated,geometry.segment_box_rest,(in_segment & ~in_line_rest)[:,np.newaxis,:] & candidates[geometry.segment_box_rest])
+    return eliminated
+
+subset_combinations = {}
+
+def locked_sets(matrix, k):
+    # matrix is (groups, rows, columns) bool. when k rows of a group, each with 2 to k entries,
+    # have only k columns between them, those columns are taken: the other rows of the group
+    # lose them. naked subsets, hidden subsets and x-wings are this on different transposes
+    (groups,rows,columns) = matrix.shape
+    if (rows,k) not in subset_combinations:
+        subset_combinations[(rows,k)] = np.array(list(itertools.combinations(range(rows),k)))
+    combinations = subset_combinations[(rows,k)]
+    counts = np.count_nonzero(matrix,axis=2)
+    eligible = np.all(((counts >= 2) & (counts <= k))[:,combinations],axis=2)
+    union = np.any(matrix[:,combinations],axis=2)
+    eliminated = np.zeros_like(matrix)
+    for (group,combination) in zip(*np.nonzero(eligible & (np.count_nonzero(union,axis=2) == k))):
+        others = np.ones([rows],dtype=bool)
+        others[combinations[combination]] = False
+        eliminated[group,others] |= union[group,combination] & matrix[group,others]
+    return eliminated
+
+def naked_subsets(candidates, geometry, k):
+    # k cells of a unit with only k values between them: the rest of the unit loses those values
+    eliminated = np.zeros_like(candidates)
+    np.logical_or.at(eliminated,geometry.units,locked_sets(candidates[geometry.units],k))
+    return eliminated
+
+def hidden_subsets(candidates, geometry, k):
+    # k values of a unit with only k cells between them: those cells lose every other value
+    eliminated = np.zeros_like(candidates)
+    np.logical_or.at(eliminated,geometry.units,locked_sets(candidates[geometry.units].transpose([0,2,1]),k).transpose([0,2,1]))
+    return eliminated
+
+def x_wing(candidates, geometry):
+    # a value confined to the same two columns in two rows comes out of the rest of those
+    # columns, and the same with rows and columns swapped
+    size = geometry.size
+    grid = candidates.reshape([size,size,size])
+    eliminated = locked_sets(grid.transpose([2,0,1]),2).transpose([1,2,0])
+    eliminated |= locked_sets(grid.transpose([2,1,0]),2).transpose([2,1,0])
+    return eliminated.reshape([geometry.cell_count,size])
+
+STRATEGIES = {
+    "locked_candidates": locked_candidates,
+    "naked_pair": lambda candidates, geometry: naked_subsets(candidates,geometry,2),
+    "hidden_pair": lambda candidates, geometry: hidden_subsets(candidates,geometry,2),
+    "x_wing": x_wing,
+    "naked_triple": lambda candidates, geometry: naked_subsets(candidates,geometry,3),
+    "hidden_triple": lambda candidates, geometry: hidden_subsets(candidates,geometry,3),
+}
+# every strategy, cheapest first. the singles are run by the boards themselves
+STRATEGY_CHAIN = ["naked_single","hidden_single"] + list(STRATEGIES)
+
+def strategy_chain(hidden_singles=False, strategies=None):
+    # the strategies apply_constraints_iteratively runs, in chain order. naked singles always
+    # run, and hidden_singles=True is the same as asking for "hidden_single"
+    chosen = {"naked_single"} | set(strategies or [])
+    if hidden_singles:
+        chosen.add("hidden_single")
+    assert(chosen <= set(STRATEGY_CHAIN))
+    return [name for name in STRATEGY_CHAIN if name in chosen]
+
+def candidate_cube(masks, size):
+    # (cells,size) bool candidates from one bitmask per cell
+    masks = np.asarray(masks)
+    return ((masks.reshape([-1,1]) >> np.arange(size,dtype=masks.dtype)) & 1) != 0
+
+def forced_cells(candidates, values, geometry, hidden_singles=False):
+    # (cells, values) the cube forces on the empty cells: a single candidate, or with
+    # hidden_singles the only place for a value in a unit. a cell forced two ways is left alone
+    forced = candidates & (np.count_nonzero(candidates,axis=1) == 1)[:,np.newaxis]
+    if hidden_singles:
+        unit_candidates = candidates[geometry.units]
+        np.logical_or.at(forced,geometry.units,unit_candidates & (np.count_nonzero(unit_candidates,axis=1) == 1)[:,np.newaxis,:])
+    cells = np.flatnonzero((np.asarray(values).reshape([-1]) == 0) & (np.count_nonzero(forced,axis=1) == 1))
+    return (cells,(np.argmax(forced[cells],axis=1) + 1).astype(np.uint8))
+
+def strategy_deductions(candidates, values, geometry, strategies):
+    # runs the chain past the singles on a copy of the cube: after every elimination it looks for
+    # forced cells and otherwise starts over at the cheapest strategy. stops at the first forced
+    # cells, returned as (cells, values), or when no strategy rules anything out
+    candidates = candidates.copy()
+    names = [name for name in strategies if name in STRATEGIES]
+    progress = True
+    while progress:
+        progress = False
+        for name in names:
+            eliminated = STRATEGIES[name](candidates,geometry) & candidates
+            count = int(np.count_nonzero(eliminated))
+            if count == 0:
+                continue
+            solver_stats.count("strategy_hits." + name)
+            solver_stats.count("candidates_eliminated." + name,count)
+            candidates &= ~eliminated
+            (cells,forced_values) = forced_cells(candidates,values,geometry,"hidden_single" in strategies)
+            if len(cells) > 0:
+                solver_stats.count("cells_fixed." + name,len(cells))
+                return (cells,forced_values)
+            progress = True
+            break
+    return (np.zeros([0],dtype=np.intp),np.zeros([0],dtype=np.uint8))
+
+
+class GeneralSudokuBoard:
+    # BitmaskSudokuBoard for any box size: 3 is the usual 9x9, 4 gives 16x16 and 5 gives 25x25.
+    # candidates are one mask per cell, and unit_used holds the values placed in every row,
+    # column and box (in that order, as in BoardGeometry.units)
+    __slots__ = ("geometry","cells","unit_used","_creation_hash")
+
+    def __init__(self, box_size=3):
+        self.geometry = BoardGeometry.for_box_size(box_size)
+        self.cells = np.zeros([self.geometry.cell_count],dtype=np.uint8)
+        self.unit_used = np.zeros([3*self.geometry.size],dtype=self.geometry.mask_dtype)
+        self._creation_hash = ""
+
+    @property
+    def known_values(self):
+        return self.cells.reshape([self.geometry.size,self.geometry.size])
+
+    def initialize_board_from_string(self,input_string):
+        self.cells[:] = CHARACTER_VALUES[np.frombuffer(input_string[0:self.geometry.cell_count].encode("ascii"),dtype=np.uint8)]
+        assert(np.all(self.cells <= self.geometry.size))
+        self.refresh_occupancy()
+
+    def refresh_occupancy(self):
+        self.unit_used[:] = np.bitwise_or.reduce(self.geometry.value_to_bit[self.cells][self.geometry.units],axis=1)
+
+    def candidates(self):
+        geometry = self.geometry
+        blocked = np.bitwise_or.reduce(self.unit_used[geometry.cell_units],axis=1)
+        return np.where(self.cells == 0, ~blocked & geometry.all_candidates, geometry.value_to_bit[self.cells]).astype(geometry.mask_dtype)
+
+    def get_board(self):
+        return self.known_values
+
+    def print_board_string(self):
+        return BOARD_CHARACTER_BYTES[self.cells].tobytes().decode("ascii")
+
+    def filled_cells(self):
+        return np.count_nonzero(self.cells)
+
+    def unfilled_cells(self):
+        return self.geometry.cell_count - self.filled_cells()
+
+    def clone(self):
+        board_copy = GeneralSudokuBoard.__new__(type(self))
+        board_copy.geometry = self.geometry
+        board_copy.cells = self.cells.copy()
+        board_copy.unit_used = self.unit_used.copy()
+        board_copy._creation_hash = self._creation_hash
+        return board_copy
+
+    def mark_creation_hash(self):
+        self._creation_hash = hashlib.sha256(self.known_values.astype("L").tobytes(), usedforsecurity=False).hexdigest()[0:8]
+
+    def creation_hash(self):
+        return self._creation_hash
+
+    def valid(self):
+        # every empty cell has a candidate and no unit holds a value twice
+        filled_per_unit = np.count_nonzero(self.cells[self.geometry.units],axis=1)
+        if np.any(mask_popcount(self.unit_used) != filled_per_unit):
+            return False
+        return bool(np.all(self.candidates() != 0))
+
+    def contradicted(self):
+        # not valid, or some value has no cell left in some unit
+        if not self.valid():
+            return True
+        reachable = np.bitwise_or.reduce(self.candidates()[self.geometry.units],axis=1)
+        return bool(np.any(reachable != self.geometry.all_candidates))
+
+    def guesses(self):
+        candidates = self.candidates()
+        size = self.geometry.size
+        current_guesses = []
+        for cell in np.flatnonzero(mask_popcount(candidates) > 1):
+            mask = int(candidates[cell])
+            for value in range(1,size+1):
+                if mask & (1 << (value-1)):
+                    current_guesses.append((int(cell) // size,int(cell) % size,value))
+        return current_guesses
+
+    # mutating function all below here
+    def apply_known_value(self, row, col, value):
+        assert(type(value) == type(1))
+        assert(row < self.geometry.size)
+        assert(col < self.geometry.size)
+        assert(value <= self.geometry.size)
+        assert(value >= 1)
+
+        cell = row*self.geometry.size + col
+        if self.cells[cell] != 0:
+            self.cells[cell] = value
+            self.refresh_occupancy()
+            return
+        self.cells[cell] = value
+        self.unit_used[self.geometry.cell_units[cell]] |= self.geometry.value_to_bit[value]
+
+    def apply_known_cells(self, cells, values):
+        # bulk version of apply_known_value for empty cells (flat indices)
+        bits = self.geometry.value_to_bit[values]
+        self.cells[cells] = values
+        for unit in range(3):
+            np.bitwise_or.at(self.unit_used,self.geometry.cell_units[cells,unit],bits)
+
+    def apply_naked_singles(self):
+        candidates = self.candidates()
+        singles = np.flatnonzero((self.cells == 0) & (mask_popcount(candidates) == 1))
+        if len(singles) == 0:
+            return 0
+        self.apply_known_cells(singles,mask_values(candidates[singles]))
+        return len(singles)
+
+    def hidden_single_masks(self, candidates):
+        # the values that fit exactly one cell of a unit, found a cell position at a time with
+        # "seen once" and "seen twice" masks, so nothing is expanded to one entry per value
+        geometry = self.geometry
+        unit_candidates = candidates[geometry.units]
+        once = np.zeros([3*geometry.size],dtype=geometry.mask_dtype)
+        twice = np.zeros([3*geometry.size],dtype=geometry.mask_dtype)
+        for position in range(geometry.size):
+            twice |= once & unit_candidates[:,position]
+            once |= unit_candidates[:,position]
+        hidden = once & ~twice & ~self.unit_used
+        # the hidden values each cell gets from its row, column and box, plus its own value if it
+        # has one candidate left (the cell constraint, as in convert_possibilities_to_hidden_singles)
+        cell_hidden = np.bitwise_or.reduce(hidden[geometry.cell_units],axis=1) & candidates
+        cell_hidden |= np.where(mask_popcount(candidates) == 1,candidates,0).astype(geometry.mask_dtype)
+        return cell_hidden
+
+    def apply_hidden_singles(self):
+        cell_hidden = self.hidden_single_masks(self.candidates())
+        singles = np.flatnonzero((self.cells == 0) & (mask_popcount(cell_hidden) == 1))
+        self.apply_known_cells(singles,mask_values(cell_hidden[singles]))
+        return len(singles)
+
+    def apply_singles(self, hidden_singles=False):
+        # naked and hidden singles from one candidates() snapshot, as in BitmaskSudokuBoard
+        candidates = self.candidates()
+        naked = (self.cells == 0) & (mask_popcount(candidates) == 1)
+        values = np.where(naked,mask_values(candidates),0).astype(np.uint8)
+        hidden = np.zeros([self.geometry.cell_count],dtype=bool)
+        if hidden_singles:
+            cell_hidden = self.hidden_single_masks(candidates)
+            hidden = (self.cells == 0) & ~naked & (mask_popcount(cell_hidden) == 1)
+            values[hidden] = mask_values(cell_hidden[hidden])
+        singles = np.flatnonzero(values)
+        self.apply_known_cells(singles,values[singles])
+        solver_stats.count("cells_fixed.naked_single",int(np.count_nonzero(naked)))
+        solver_stats.count("cells_fixed.hidden_single",int(np.count_nonzero(hidden)))
+        return len(singles)
+
+    def apply_strategies(self, strategies):
+        (cells,values) = strategy_deductions(candidate_cube(self.candidates(),self.geometry.size),self.cells,self.geometry,strategies)
+        self.apply_known_cells(cells,values)
+        return len(cells)
+
+    def apply_constraints_iteratively(self, hidden_singles=False, strategies=None):
+        # same pass counting as SudokuBoard.apply_constraints_iteratively
+        strategies = strategy_chain(hidden_singles,strategies)
+        starting = 0
+        ending = self.geometry.cell_count
+        iterations = 0
+        while (starting < ending) and not self.contradicted():
+            starting = self.filled_cells()
+            self.apply_singles("hidden_single" in strategies)
+            if self.filled_cells() == starting and strategies[-1] in STRATEGIES:
+                self.apply_strategies(strategies)
+            iterations += 1
+            ending = self.filled_cells()
+            solver_stats.count("propagation_passes")
+            solver_stats.observe("cells_fixed_per_pass",int(ending - starting))
+            solver_stats.trace("pass",board=self,iteration=iterations,fixed=ending - starting)
+        return iterations
+
+    def count_solutions(self, limit=2, max_nodes=None):
+        (found,search_stats) = DepthFirstSolver(max_nodes=max_nodes).count_solutions(self,limit)
+        return BUDGET_EXHAUSTED if search_stats.budget_exhausted else found
+
+    def canonical_form(self):
+        # the symmetry group of canonical_form is the 9x9 one
+        if self.geometry.box_size != 3:
+            raise ValueError(f"canonical forms are defined for 9x9 boards only, not {self.geometry.size}x{self.geometry.size}")
+        return canonical_form(self.cells)
+
+    def check_solution_string(self,solution_string):
+        solution = CHARACTER_VALUES[np.frombuffer(solution_string[0:self.geometry.cell_count].encode("ascii"),dtype=np.uint8)]
+        return not verify_solutions(self.cells,solution).mismatched[0]
+
+
+def board_key(board):
+    # compact transposition key: one byte per cell
+    return np.asarray(board.known_values,dtype=np.uint8).tobytes()
+
+def board_string_key(board_string):
+    # the board_key of the board a string describes, for any board size
+    return CHARACTER_VALUES[np.frombuffer(board_string.strip().encode("ascii"),dtype=np.uint8)].tobytes()
+
+
+class TranspositionTable:
+    # fixed size mapping that evicts the least recently used entry when full
+    def __init__(self, capacity=100000):
+        assert(capacity > 0)
+        self.capacity = capacity
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key]
+        self.misses += 1
+        return default
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+
+# transposition outcome of a board state that cannot lead to a solution
+# (solved states store their 81 character solution instead)
+DEAD_BOARD = "dead"
+
+class SudokuGuesser:
+    def __init__(self, hidden_singles=False, capacity=100000, strategies=None):
+        # boards, the guess graph and the proven outcomes are all bounded, keyed by board_key
+        self.boards = TranspositionTable(capacity)
+        self.board_graph = TranspositionTable(capacity)
+        self.outcomes = TranspositionTable(capacity)
+        self.hidden_singles = hidden_singles
+        self.strategies = strategies
+        self.capacity = capacity
+        # explore gives up (without marking anything dead) once this event is set
+        self.cancel_event = None
     
     def add_board(self, new_board : SudokuBoard, origin_board : SudokuBoard, guess):
         # preconditions to adding guesses
@@ -308,109 +1220,1587 @@ class SudokuGuesser:
         assert(new_board.valid())
         # 2/ the new board is not complete
         before = new_board.filled_cells()
-        assert(before < 81)
+        assert(before < new_board.known_values.size)
         # 3/ the board is iterated to the final state
-        new_board.apply_constraints_iteratively()
+        new_board.apply_constraints_iteratively(self.hidden_singles,self.strategies)
         after = new_board.filled_cells()
         assert(before == after)
 
-        # store the board keyed by it's string
-        self.boards[new_board.print_board_string()] = new_board
-        self.board_graph[new_board.print_board_string()] = []
+        # store the board keyed by its compact key
+        new_key = board_key(new_board)
+        self.boards[new_key] = new_board
+        if new_key not in self.board_graph:
+            self.board_graph[new_key] = []
 
         # on the initial add, we allow no origin, since this is the root node
         if origin_board is None:
             assert(len(self.boards) == 1)
         else:
             # add the graph entry
-            self.board_graph[origin_board.print_board_string()] = (new_board.print_board_string(), guess)
+            self.add_edge(board_key(origin_board),new_key,guess)
+
+    def add_edge(self, origin_key, new_key, guess):
+        edges = self.board_graph.get(origin_key,[])
+        edges.append((new_key,guess))
+        self.board_graph[origin_key] = edges
+
+    def solution_board(self, board, solution_string):
+        # a clone keeps the board type and size
+        solution = board.clone()
+        solution.initialize_board_from_string(solution_string)
+        return solution
 
     def process_board(self,board_string) -> (SudokuBoard, list[SudokuBoard]):
         # get the board
-        board: SudokuBoard = self.boards[board_string]
+        key = board_string_key(board_string)
+        board: SudokuBoard = self.boards[key]
+        # states already proven dead or solved are not expanded again
+        outcome = self.outcomes.get(key)
+        if outcome == DEAD_BOARD:
+            solver_stats.count("transposition_hits")
+            return (None,[])
+        if outcome is not None:
+            solver_stats.count("transposition_hits")
+            return (self.solution_board(board,outcome),[])
         # get all it's guesses
         guesses = board.guesses()
         good_guess_boards = []
         for guess in guesses:
+            # the state right after the guess can be looked up without cloning
+            guess_key = bytearray(key)
+            guess_key[guess[0]*board.known_values.shape[1] + guess[1]] = guess[2]
+            guess_key = bytes(guess_key)
+            outcome = self.outcomes.get(guess_key)
+            if outcome == DEAD_BOARD:
+                solver_stats.count("transposition_hits")
+                solver_stats.count("guesses_rejected")
+                continue
+            if outcome is not None:
+                solver_stats.count("transposition_hits")
+                return (self.solution_board(board,outcome),good_guess_boards)
+
             #clone the board
-            clone = copy.deepcopy(board)
+            clone = board.clone()
+            solver_stats.count("clones")
+            if solver_stats.enabled:
+                solver_stats.count("bytes_allocated",board_nbytes(clone))
             #apply the guess
             clone.apply_known_value(guess[0],guess[1],guess[2])
+            solver_stats.count("guesses_tried")
+            solver_stats.trace("guess",board=clone,guess=guess)
             #advance the board
-            clone.apply_constraints_iteratively()
+            clone.apply_constraints_iteratively(self.hidden_singles,self.strategies)
+            clone_key = board_key(clone)
             #check for invalidity or completeness
-            if not clone.valid():
+            if clone.contradicted():
                 # print(f"guess {guess} led to an invalid board")
+                solver_stats.count("guesses_rejected")
+                self.outcomes[guess_key] = DEAD_BOARD
+                self.outcomes[clone_key] = DEAD_BOARD
                 continue
-            if clone.filled_cells() == 81:
+            if clone.filled_cells() == clone.known_values.size:
                 # print(f"guess {guess} got the answer with all 81 solved ")
+                self.outcomes[guess_key] = clone.print_board_string()
                 return (clone,good_guess_boards)
+            # different guesses often propagate to the same board
+            if self.outcomes.get(clone_key) == DEAD_BOARD:
+                solver_stats.count("transposition_hits")
+                solver_stats.count("guesses_rejected")
+                self.outcomes[guess_key] = DEAD_BOARD
+                continue
+            self.add_edge(key,clone_key,guess)
             good_guess_boards.append(clone)
         # print(f"There were {len(guesses)} and {len(good_guess_boards)} of them were good")
+        if len(good_guess_boards) == 0:
+            self.outcomes[key] = DEAD_BOARD
         return (None,good_guess_boards)
+
+    def explore(self, board_string):
+        # depth first over process_board until a solution is found, marking exhausted boards dead.
+        # returns the solved board or None
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            return None
+        (solution,good_guess_boards) = self.process_board(board_string)
+        if solution is not None:
+            return solution
+        for clone in good_guess_boards:
+            clone_key = board_key(clone)
+            if self.outcomes.get(clone_key) == DEAD_BOARD:
+                continue
+            self.boards[clone_key] = clone
+            solution = self.explore(clone.print_board_string())
+            if solution is not None:
+                self.outcomes[board_string_key(board_string)] = solution.print_board_string()
+                return solution
+            if self.cancel_event is not None and self.cancel_event.is_set():
+                return None
+        self.outcomes[board_string_key(board_string)] = DEAD_BOARD
+        return None
+
+    def explore_parallel(self, board_string, workers=None):
+        # explore, but with the top level branches of board_string fanned out to a process pool.
+        # branches travel as 81 byte board keys, and the first branch to find a solution
+        # cancels the rest. returns the solved board or None
+        (solution,good_guess_boards) = self.process_board(board_string)
+        if solution is not None:
+            return solution
+        board_type = type(self.boards[board_string_key(board_string)])
+        branch_keys = [board_key(clone) for clone in good_guess_boards]
+        branch_keys = [key for key in branch_keys if self.outcomes.get(key) != DEAD_BOARD]
+        if workers is None:
+            workers = os.cpu_count()
+        workers = max(min(workers,len(branch_keys)),1)
+        arguments = [(key,board_type,self.hidden_singles,self.capacity,self.strategies) for key in branch_keys]
+
+        cancel_event = multiprocessing.Event()
+        with multiprocessing.Pool(workers,initializer=init_branch_worker,initargs=(cancel_event,)) as pool:
+            for (key,solution_string) in pool.imap_unordered(explore_branch,arguments):
+                if solution_string is not None:
+                    # workers still searching stop at their next explore call; leaving the
+                    # with block terminates the pool
+                    cancel_event.set()
+                    solver_stats.count("branches_cancelled",len(branch_keys) - 1)
+                    self.outcomes[board_string_key(board_string)] = solution_string
+                    return self.solution_board(self.boards[board_string_key(board_string)],solution_string)
+                self.outcomes[key] = DEAD_BOARD
+        self.outcomes[board_string_key(board_string)] = DEAD_BOARD
+        return None
         
-def run_many_games(count):
-    game_file = open("boards/finnish.csv")
-    hard_game_file = open("boards/hardgames.csv",mode="w")
 
-    header = game_file.readline()
-    hard_game_file.write(header)
+# set in pool workers by init_branch_worker, so explore_branch can see cancellation
+branch_cancel_event = None
+
+def init_branch_worker(event):
+    global branch_cancel_event
+    branch_cancel_event = event
+
+def board_from_key(key, board_type=SudokuBoard):
+    # the board size follows from the key length; only GeneralSudokuBoard comes in other sizes
+    box_size = int(round(len(key) ** 0.25))
+    board = board_type(box_size) if board_type is GeneralSudokuBoard else board_type()
+    board.initialize_board_from_string(BOARD_CHARACTER_BYTES[np.frombuffer(key,dtype=np.uint8)].tobytes().decode("ascii"))
+    return board
+
+def explore_branch(arguments):
+    # worker side of SudokuGuesser.explore_parallel: explore one branch with its own guesser.
+    # returns (branch key, solution string or None)
+    (key,board_type,hidden_singles,capacity,strategies) = arguments
+    if branch_cancel_event is not None and branch_cancel_event.is_set():
+        return (key,None)
+    board = board_from_key(key,board_type)
+    guesser = SudokuGuesser(hidden_singles,capacity,strategies)
+    guesser.cancel_event = branch_cancel_event
+    guesser.add_board(board,None,None)
+    solution = guesser.explore(board.print_board_string())
+    return (key,None if solution is None else solution.print_board_string())
+
+
+class SearchStatistics:
+    # nodes are search calls, backtracks are branches that were undone
+    def __init__(self):
+        self.nodes = 0
+        self.backtracks = 0
+        self.max_depth = 0
+        self.elapsed = 0.0
+        self.budget_exhausted = False
+
+    def __repr__(self):
+        return f"nodes={self.nodes} backtracks={self.backtracks} max_depth={self.max_depth} elapsed={self.elapsed:.4f}"
+
+
+class DepthFirstSolver:
+    # complete backtracking search: branch on the cell with the fewest candidates (MRV),
+    # propagate naked singles, and undo changes from a trail instead of copying boards.
+    # boards of any size work; a GeneralSudokuBoard brings its own geometry, the rest are 9x9
+
+    # plain lists index faster than numpy arrays one element at a time, per box size
+    peer_lists = {}
+
+    def __init__(self, max_nodes=None, max_seconds=None):
+        self.max_nodes = max_nodes
+        self.max_seconds = max_seconds
+
+    def reset(self, geometry):
+        if geometry.box_size not in DepthFirstSolver.peer_lists:
+            DepthFirstSolver.peer_lists[geometry.box_size] = geometry.peers.tolist()
+        self.peers = DepthFirstSolver.peer_lists[geometry.box_size]
+        self.size = geometry.size
+        self.cell_count = geometry.cell_count
+        self.stats = SearchStatistics()
+        self.values = [0]*geometry.cell_count
+        self.candidates = [int(geometry.all_candidates)]*geometry.cell_count
+        self.trail = []
+        self.start_time = time.time()
+
+    def solution_board(self, board):
+        # the first solution found, as a board of the same type and size
+        solution = board.clone()
+        solution.initialize_board_from_string("".join([BOARD_CHARACTERS[value] for value in self.first_solution]))
+        return solution
+
+    def solve(self, board):
+        # returns (solved board of the same type or None, SearchStatistics)
+        self.run(board,1)
+        if self.found == 0:
+            return (None,self.stats)
+        return (self.solution_board(board),self.stats)
+
+    def count_solutions(self, board, limit=2):
+        # returns (number of solutions, SearchStatistics), stopping once limit solutions are found
+        # (limit=None counts them all). the count is only a lower bound if the budget ran out
+        self.run(board,limit)
+        return (self.found,self.stats)
+
+    def solve_excluding(self, board, cell, value):
+        # solve with value ruled out of cell (a flat index). if board with value at cell has a
+        # unique solution, board itself is unique exactly when this finds nothing
+        self.run(board,1,(cell,value))
+        if self.found == 0:
+            return (None,self.stats)
+        return (self.solution_board(board),self.stats)
+
+    def run(self, board, limit, excluded=None):
+        geometry = getattr(board,"geometry",None) or BoardGeometry.for_box_size(3)
+        self.reset(geometry)
+        self.limit = limit
+        self.found = 0
+        self.first_solution = None
+
+        consistent = True
+        board_string = board.print_board_string()[0:geometry.cell_count]
+        for cell, value in enumerate(CHARACTER_VALUES[np.frombuffer(board_string.encode("ascii"),dtype=np.uint8)].tolist()):
+            if value != 0 and not self.assign(cell,value):
+                consistent = False
+                break
+        if consistent and excluded is not None:
+            consistent = self.eliminate(*excluded)
+        if consistent:
+            with solver_stats.phase("search"):
+                self.search(0)
+
+        self.stats.elapsed = time.time() - self.start_time
+        solver_stats.count("search_nodes",self.stats.nodes)
+        solver_stats.count("search_backtracks",self.stats.backtracks)
+
+    def assign(self, cell, value):
+        # set a value and eliminate it from the peers, following any naked singles this creates.
+        # every change goes on the trail so undo() can roll it back. the lists are bound to
+        # locals: this loop is most of the time of a search
+        values = self.values
+        candidates = self.candidates
+        peers = self.peers
+        trail_append = self.trail.append
+        pending = [(cell,value)]
+        while pending:
+            cell, value = pending.pop()
+            bit = 1 << (value-1)
+            if values[cell] != 0:
+                if values[cell] != value:
+                    return False
+                continue
+            if not (candidates[cell] & bit):
+                return False
+            trail_append((cell,candidates[cell],0))
+            values[cell] = value
+            candidates[cell] = bit
+            for peer in peers[cell]:
+                peer_candidates = candidates[peer]
+                if peer_candidates & bit:
+                    if values[peer] != 0:
+                        return False
+                    trail_append((peer,peer_candidates,0))
+                    peer_candidates &= ~bit
+                    candidates[peer] = peer_candidates
+                    if peer_candidates == 0:
+                        return False
+                    if peer_candidates.bit_count() == 1:
+                        pending.append((peer,peer_candidates.bit_length()))
+        return True
+
+    def eliminate(self, cell, value):
+        # remove one candidate, assigning the cell if a single one is left
+        bit = 1 << (value-1)
+        if self.values[cell] != 0:
+            return self.values[cell] != value
+        if not (self.candidates[cell] & bit):
+            return True
+        self.trail.append((cell,self.candidates[cell],0))
+        self.candidates[cell] &= ~bit
+        if self.candidates[cell] == 0:
+            return False
+        if self.candidates[cell].bit_count() == 1:
+            return self.assign(cell,self.candidates[cell].bit_length())
+        return True
+
+    def undo(self, mark):
+        trail = self.trail
+        for index in range(len(trail)-1,mark-1,-1):
+            cell, cell_candidates, value = trail[index]
+            self.candidates[cell] = cell_candidates
+            self.values[cell] = value
+        del trail[mark:]
+
+    def budget_exhausted(self):
+        if self.max_nodes is not None and self.stats.nodes >= self.max_nodes:
+            return True
+        if self.max_seconds is not None and time.time() - self.start_time >= self.max_seconds:
+            return True
+        return False
+
+    def search(self, depth):
+        self.stats.nodes += 1
+        self.stats.max_depth = max(self.stats.max_depth,depth)
+        if self.budget_exhausted():
+            self.stats.budget_exhausted = True
+            return False
+
+        # minimum remaining values: the empty cell with the fewest candidates
+        best_cell = -1
+        best_count = self.size + 1
+        for cell in range(self.cell_count):
+            if self.values[cell] == 0:
+                count = self.candidates[cell].bit_count()
+                if count < best_count:
+                    best_cell = cell
+                    best_count = count
+                    if count == 2:
+                        break
+        if best_cell == -1:
+            # a solution. True stops the search once enough have been found
+            self.found += 1
+            if self.first_solution is None:
+                self.first_solution = list(self.values)
+            return self.limit is not None and self.found >= self.limit
+
+        candidates = self.candidates[best_cell]
+        for value in range(1,self.size+1):
+            if candidates & (1 << (value-1)):
+                mark = len(self.trail)
+                if self.assign(best_cell,value) and self.search(depth+1):
+                    return True
+                self.undo(mark)
+                if self.stats.budget_exhausted:
+                    return False
+                self.stats.backtracks += 1
+        return False
+
+
+class ExactCoverSolver:
+    # sudoku as exact cover: 729 candidate rows against the 324 constraint columns of
+    # SudokuBoard.masks, searched with Algorithm X over an array based dancing links structure.
+    # the structure is built once; every search unwinds completely, so a solver is reused across puzzles
+
+    template = None
+
+    def build_template():
+        # nodes 0..323 are the column headers, 324 is the root, then four nodes per candidate row
+        root = 324
+        left = list(range(-1,324))
+        left[0] = root
+        right = list(range(1,325)) + [0]
+        up = list(range(325))
+        down = list(range(325))
+        column = list(range(325))
+        row_of = [-1]*325
+        size = [0]*325
+
+        for candidate in range(729):
+            constraints = np.flatnonzero(SudokuBoard.constraint_matrix[:,candidate])
+            assert(len(constraints) == 4)
+            first = len(left)
+            for index, constraint in enumerate(constraints):
+                node = first + index
+                left.append(first + (index-1) % 4)
+                right.append(first + (index+1) % 4)
+                # append the node at the bottom of its column
+                up.append(up[constraint])
+                down.append(constraint)
+                down[up[constraint]] = node
+                up[constraint] = node
+                column.append(int(constraint))
+                row_of.append(candidate)
+                size[constraint] += 1
+
+        # the first node of every candidate row, so givens can be selected directly
+        row_node = [325 + candidate*4 for candidate in range(729)]
+        return (left,right,up,down,column,row_of,size,row_node)
+
+    def __init__(self):
+        if ExactCoverSolver.template is None:
+            ExactCoverSolver.template = ExactCoverSolver.build_template()
+        self.reset()
+
+    def reset(self):
+        # restore the pristine structure (only needed if a search was interrupted)
+        (left,right,up,down,column,row_of,size,row_node) = ExactCoverSolver.template
+        self.left = left.copy()
+        self.right = right.copy()
+        self.up = up.copy()
+        self.down = down.copy()
+        self.column = column
+        self.row_of = row_of
+        self.size = size.copy()
+        self.row_node = row_node
+        self.nodes = 0
+
+    def cover(self, col):
+        left, right, up, down, column, size = self.left, self.right, self.up, self.down, self.column, self.size
+        right[left[col]] = right[col]
+        left[right[col]] = left[col]
+        row = down[col]
+        while row != col:
+            node = right[row]
+            while node != row:
+                down[up[node]] = down[node]
+                up[down[node]] = up[node]
+                size[column[node]] -= 1
+                node = right[node]
+            row = down[row]
+
+    def uncover(self, col):
+        left, right, up, down, column, size = self.left, self.right, self.up, self.down, self.column, self.size
+        row = up[col]
+        while row != col:
+            node = left[row]
+            while node != row:
+                size[column[node]] += 1
+                down[up[node]] = node
+                up[down[node]] = node
+                node = left[node]
+            row = up[row]
+        right[left[col]] = col
+        left[right[col]] = col
+
+    def search(self, limit, partial, solutions):
+        self.nodes += 1
+        right, down, size = self.right, self.down, self.size
+        if right[324] == 324:
+            solutions.append(list(partial))
+            return
+        # branch on the column with the fewest remaining rows
+        col = right[324]
+        best = col
+        while col != 324:
+            if size[col] < size[best]:
+                best = col
+                if size[best] <= 1:
+                    break
+            col = right[col]
+        if size[best] == 0:
+            return
+
+        self.cover(best)
+        row = down[best]
+        while row != best:
+            partial.append(self.row_of[row])
+            node = right[row]
+            while node != row:
+                self.cover(self.column[node])
+                node = right[node]
+            self.search(limit, partial, solutions)
+            node = self.left[row]
+            while node != row:
+                self.uncover(self.column[node])
+                node = self.left[node]
+            partial.pop()
+            if limit is not None and len(solutions) >= limit:
+                break
+            row = down[row]
+        self.uncover(best)
+
+    def find_solutions(self, board, limit=None):
+        # returns up to limit solutions (all of them for None) as 81 character strings.
+        # the columns are those of the 9x9 constraint matrix, so other sizes are refused
+        geometry = getattr(board,"geometry",None)
+        if geometry is not None and geometry.box_size != 3:
+            raise ValueError(f"ExactCoverSolver solves 9x9 boards only, not {geometry.size}x{geometry.size} (use DepthFirstSolver)")
+        self.nodes = 0
+        givens = []
+        covered = set()
+        consistent = True
+        for cell, value in enumerate(board.print_board_string()[0:81]):
+            if value == "0":
+                continue
+            first = self.row_node[cell*9 + int(value) - 1]
+            row_columns = [self.column[first + index] for index in range(4)]
+            if covered.intersection(row_columns):
+                consistent = False
+                break
+            for col in row_columns:
+                self.cover(col)
+            covered.update(row_columns)
+            givens.append((cell*9 + int(value) - 1,row_columns))
+
+        solutions = []
+        if consistent:
+            self.search(limit, [candidate for candidate, row_columns in givens], solutions)
+
+        # uncover the givens in reverse, which leaves the structure ready for the next puzzle
+        for candidate, row_columns in reversed(givens):
+            for col in reversed(row_columns):
+                self.uncover(col)
+
+        solution_strings = []
+        for solution in solutions:
+            values = ["0"]*81
+            for candidate in solution:
+                values[candidate // 9] = str(candidate % 9 + 1)
+            solution_strings.append("".join(values))
+        return solution_strings
+
+    def solve(self, board):
+        # returns the first solution as a board of the same type, or None
+        solutions = self.find_solutions(board, limit=1)
+        if len(solutions) == 0:
+            return None
+        solution = type(board)()
+        solution.initialize_board_from_string(solutions[0])
+        return solution
+
+    def count_solutions(self, board, limit=2):
+        return len(self.find_solutions(board, limit))
+
+    def enumerate_solutions(self, board):
+        return self.find_solutions(board, limit=None)
+
+
+def batch_candidates(values):
+    # values is an (N,81) array of known values. returns the (N,81,9) candidate tensor and
+    # a per-board validity flag, the opposite of the boards' contradicted(): no duplicated value
+    # in a unit, no empty cell without candidates and no value that no cell of a unit can take
+    count = values.shape[0]
+    onehot = (values[:,:,np.newaxis] == np.arange(1,10,dtype=values.dtype))
+    grid = onehot.reshape([count,9,9,9])
+    row_counts = np.sum(grid,axis=2,dtype=np.uint8)
+    col_counts = np.sum(grid,axis=1,dtype=np.uint8)
+    box_counts = np.sum(grid.reshape([count,3,3,3,3,9]),axis=(2,4),dtype=np.uint8).reshape([count,9,9])
+
+    blocked = (row_counts[:,CELL_ROW,:] | col_counts[:,CELL_COL,:] | box_counts[:,CELL_BOX,:]) != 0
+    candidates = np.where((values == 0)[:,:,np.newaxis], ~blocked, onehot)
+
+    duplicates = np.maximum(np.maximum(row_counts.max(axis=(1,2)),col_counts.max(axis=(1,2))),box_counts.max(axis=(1,2))) > 1
+    homeless = ~np.all(np.any(candidates[:,UNITS,:],axis=2),axis=(1,2))
+    valid = ~duplicates & np.all(np.any(candidates,axis=2),axis=1) & ~homeless
+    return candidates, valid
+
+def unit_contradictions(candidates, values):
+    # candidates is an (N,81,9) bool tensor and values the (N,81) known values. True for every
+    # board that is already dead: a value twice in one of the 27 units, an empty cell without
+    # candidates, or a value that no cell of some unit can still take
+    onehot = (values[:,:,np.newaxis] == np.arange(1,10,dtype=values.dtype))
+    duplicates = np.any(np.sum(onehot[:,UNITS,:],axis=2) > 1,axis=(1,2))
+    empty_cells = np.any((values == 0) & ~np.any(candidates,axis=2),axis=1)
+    placeable = candidates | onehot
+    homeless = ~np.all(np.any(placeable[:,UNITS,:],axis=2),axis=(1,2))
+    return duplicates | empty_cells | homeless
+
+# solution count of a board whose search ran out of budget before the count was settled
+BUDGET_EXHAUSTED = -1
+
+def count_solutions_batch(quizzes, limit=2, max_nodes=None):
+    # number of solutions (up to limit) for every board of an (N,81) array, or BUDGET_EXHAUSTED
+    # where the search ran out of max_nodes. the whole batch is propagated first: a board naked
+    # singles fill in is unique, a contradicted one has none, and only the rest are searched,
+    # from their propagated state
+    (solved,iterations) = solve_batch(quizzes)
+    (candidates,valid) = batch_candidates(solved)
+    counts = np.zeros([solved.shape[0]],dtype=int)
+    counts[valid & np.all(solved != 0,axis=1)] = 1
+    solver = DepthFirstSolver(max_nodes=max_nodes)
+    board = BitmaskSudokuBoard()
+    for i in np.flatnonzero(valid & np.any(solved == 0,axis=1)):
+        board.cells[:] = solved[i]
+        (found,search_stats) = solver.count_solutions(board,limit)
+        counts[i] = BUDGET_EXHAUSTED if search_stats.budget_exhausted else found
+    return counts
+
+def count_corpus_solutions(input_path, limit=2, count=None, chunk_size=100000, max_nodes=None):
+    # count_solutions_batch over a csv or a packed corpus, chunk by chunk
+    counts = [count_solutions_batch(quizzes,limit,max_nodes) for (quizzes,solutions) in load_puzzle_chunks(input_path,chunk_size,count)]
+    if len(counts) == 0:
+        return np.zeros([0],dtype=int)
+    return np.concatenate(counts)
+
+def solve_batch(quizzes):
+    # naked single propagation for a whole batch of boards at once.
+    # quizzes is an (N,81) array of values (0 is empty). returns the propagated (N,81) grids
+    # and per-board pass counts, matching SudokuBoard.apply_constraints_iteratively
+    solved = np.array(quizzes,dtype=np.uint8).reshape([-1,81])
+    iterations = np.zeros([solved.shape[0]],dtype=int)
+
+    active = np.arange(solved.shape[0])
+    while len(active) > 0:
+        values = solved[active]
+        candidates, valid = batch_candidates(values)
+        # contradicted boards leave the active set without counting a pass
+        active = active[valid]
+        values = values[valid]
+        candidates = candidates[valid]
+
+        singles = (values == 0) & (np.sum(candidates,axis=2) == 1)
+        iterations[active] += 1
+        solved[active] = np.where(singles, np.argmax(candidates,axis=2) + 1, values)
+
+        # boards that made no progress this pass (including finished ones) are done
+        active = active[np.any(singles,axis=1)]
+
+    return solved, iterations
+
+def quizzes_from_strings(board_strings):
+    # list of 81 character strings -> (N,81) uint8 array
+    joined = "".join([board_string[0:81] for board_string in board_strings])
+    return (np.frombuffer(joined.encode("ascii"),dtype=np.uint8) - ord("0")).reshape([-1,81])
+
+class VerificationReport:
+    # verify_solutions for N boards: mismatched and finished are (N,) flags, and mismatch_cells
+    # lists every (board index, cell) that disagrees with the expected solution
+    def __init__(self, mismatched, finished, mismatch_cells):
+        self.mismatched = mismatched
+        self.finished = finished
+        self.mismatch_cells = mismatch_cells
+
+    def __len__(self):
+        return len(self.mismatched)
+
+    def __repr__(self):
+        return f"boards={len(self)} finished={np.count_nonzero(self.finished)} mismatched={np.count_nonzero(self.mismatched)}"
+
+    def mismatched_boards(self):
+        return np.flatnonzero(self.mismatched)
+
+    def concatenate(reports):
+        # one report for consecutive batches, with the board indices offset to match
+        offsets = np.cumsum([0] + [len(report) for report in reports])
+        return VerificationReport(np.concatenate([report.mismatched for report in reports]),
+                                  np.concatenate([report.finished for report in reports]),
+                                  np.concatenate([report.mismatch_cells + [offset,0] for (report,offset) in zip(reports,offsets)]))
+
+    def save(self, path, solved=None):
+        # columnar .npz export, optionally with the (N,cells) solved grids themselves
+        arrays = {"mismatched": self.mismatched, "finished": self.finished, "mismatch_cells": self.mismatch_cells}
+        if solved is not None:
+            arrays["solved"] = np.asarray(solved,dtype=np.uint8)
+        np.savez_compressed(path,**arrays)
+
+    def load(path):
+        with np.load(path) as arrays:
+            return VerificationReport(arrays["mismatched"],arrays["finished"],arrays["mismatch_cells"])
+
+def verify_solutions(solved, solutions):
+    # checks an (N,cells) array of solver output against the (N,cells) expected solutions in one
+    # pass. a board is mismatched when one of its filled cells has another value than expected;
+    # empty cells are not checked, and neither are expected cells that are 0 (corpora whose
+    # solution column is only the quiz)
+    solved = np.atleast_2d(solved)
+    solutions = np.atleast_2d(solutions).reshape(solved.shape)
+    wrong = (solved != 0) & (solutions != 0) & (solved != solutions)
+    (boards,cells) = np.nonzero(wrong)
+    return VerificationReport(np.any(wrong,axis=1),np.all(solved != 0,axis=1),np.stack([boards,cells],axis=1))
+
+def verify_corpus(input_path, count=None, chunk_size=100000, output_path=None):
+    # solve_batch and verify_solutions over a csv or a packed corpus, chunk by chunk. with
+    # output_path the report is also saved as .npz
+    reports = [verify_solutions(np.zeros([0,81],dtype=np.uint8),np.zeros([0,81],dtype=np.uint8))]
+    for (quizzes,solutions) in load_puzzle_chunks(input_path,chunk_size,count):
+        (solved,iterations) = solve_batch(quizzes)
+        reports.append(verify_solutions(solved,solutions))
+    report = VerificationReport.concatenate(reports)
+    if output_path is not None:
+        report.save(output_path)
+    return report
+
+# the 1296 orderings of the rows (or columns) that keep bands (stacks) together:
+# 6 band orders times 6 orders of the rows inside each of the 3 bands
+LINE_PERMUTATIONS = []
+for band_order in itertools.permutations(range(3)):
+    for inner_orders in itertools.product(itertools.permutations(range(3)),repeat=3):
+        LINE_PERMUTATIONS.append([band_order[band]*3 + inner_orders[band][line] for band in range(3) for line in range(3)])
+LINE_PERMUTATIONS = np.array(LINE_PERMUTATIONS,dtype=np.intp)
+assert(LINE_PERMUTATIONS.shape == (1296,9))
+# canonical rows are compared as base 11 numbers, with an empty cell sorting after every digit
+ROW_SCORE_WEIGHTS = 11 ** np.arange(8,-1,-1,dtype=np.int64)
+
+def relabel_lines(lines, mapping, next_label):
+    # give the digits of lines (M,9) their canonical labels, numbering unseen digits in order
+    # of first appearance. mapping (M,10) and next_label (M,) are updated in place
+    labels = np.zeros(lines.shape,dtype=np.uint8)
+    states = np.arange(lines.shape[0])
+    for position in range(9):
+        digits = lines[:,position]
+        unseen = (digits != 0) & (mapping[states,digits] == 0)
+        mapping[states[unseen],digits[unseen]] = next_label[unseen]
+        next_label[unseen] += 1
+        labels[:,position] = mapping[states,digits]
+    return labels
+
+def canonical_form(values):
+    # smallest relabeled grid, row by row, over transposition, band and stack orders, row and
+    # column orders inside them, and digit relabeling. empty cells sort last, so rows with clues
+    # come first and ties between symmetries are broken quickly.
+    # returns (canonical (81,) uint8 values, transform) where transform is
+    # (transposed, rows, columns, mapping) with canonical = mapping[grid_t[rows][:,columns]]
+    grid = np.asarray(values,dtype=np.uint8).reshape([9,9])
+    grids = np.stack([grid,grid.T])
+
+    # one search state per transposition, first row and column ordering
+    transposed = np.repeat(np.arange(2),9*1296)
+    rows = np.tile(np.repeat(np.arange(9),1296),2).reshape([-1,1])
+    columns = np.tile(np.arange(1296),18)
+    mapping = np.zeros([len(columns),10],dtype=np.uint8)
+    next_label = np.ones([len(columns)],dtype=np.uint8)
+
+    for row in range(9):
+        if row > 0:
+            # the next row stays in the band of the previous one, or starts an unused band
+            used = np.zeros([len(columns),9],dtype=bool)
+            used[np.arange(len(columns)).reshape([-1,1]),rows] = True
+            if row % 3 != 0:
+                allowed = (np.arange(9).reshape([1,9]) // 3 == (rows[:,-1] // 3).reshape([-1,1])) & ~used
+            else:
+                allowed = ~used
+            (states,next_rows) = np.nonzero(allowed)
+            transposed = transposed[states]
+            rows = np.hstack([rows[states],next_rows.reshape([-1,1])])
+            columns = columns[states]
+            mapping = mapping[states]
+            next_label = next_label[states]
+
+        lines = grids[transposed,rows[:,-1]][np.arange(len(columns)).reshape([-1,1]),LINE_PERMUTATIONS[columns]]
+        labels = relabel_lines(lines,mapping,next_label)
+        scores = np.where(labels == 0,10,labels).astype(np.int64) @ ROW_SCORE_WEIGHTS
+        best = (scores == np.min(scores))
+        transposed, rows, columns, mapping, next_label = transposed[best], rows[best], columns[best], mapping[best], next_label[best]
+
+        if len(columns) > 1 and row < 8:
+            # states with the same labels and the same unplaced rows (as seen through their column
+            # ordering) have the same future, so only one of them needs to be kept
+            permuted = grids[transposed][np.arange(len(columns)).reshape([-1,1,1]),np.arange(9).reshape([1,9,1]),LINE_PERMUTATIONS[columns].reshape([-1,1,9])]
+            permuted[np.arange(len(columns)).reshape([-1,1]),rows] = 255
+            keys = np.hstack([mapping,permuted.reshape([-1,81])])
+            (unique_keys,first_states) = np.unique(keys,axis=0,return_index=True)
+            first_states = np.sort(first_states)
+            transposed, rows, columns, mapping, next_label = transposed[first_states], rows[first_states], columns[first_states], mapping[first_states], next_label[first_states]
+
+    # digits missing from the grid get the remaining labels in order, so the mapping is a permutation
+    digit_mapping = mapping[0].copy()
+    label = int(next_label[0])
+    for digit in range(1,10):
+        if digit_mapping[digit] == 0:
+            digit_mapping[digit] = label
+            label += 1
+    transform = (bool(transposed[0]),rows[0].copy(),LINE_PERMUTATIONS[columns[0]].copy(),digit_mapping)
+    return (to_canonical(grid,transform),transform)
+
+def to_canonical(values, transform):
+    (transposed,rows,columns,mapping) = transform
+    grid = np.asarray(values,dtype=np.uint8).reshape([9,9])
+    if transposed:
+        grid = grid.T
+    return mapping[grid[rows][:,columns]].reshape([81])
+
+def from_canonical(values, transform):
+    # inverse of to_canonical, e.g. to map a cached canonical solution back onto the original quiz
+    (transposed,rows,columns,mapping) = transform
+    inverse_mapping = np.zeros([10],dtype=np.uint8)
+    inverse_mapping[mapping] = np.arange(10,dtype=np.uint8)
+    grid = np.zeros([9,9],dtype=np.uint8)
+    grid[np.ix_(rows,columns)] = inverse_mapping[np.asarray(values,dtype=np.uint8).reshape([9,9])]
+    if transposed:
+        grid = grid.T
+    return grid.reshape([81])
+
+def values_to_string(values):
+    return (np.asarray(values,dtype=np.uint8).reshape([81]) + ord("0")).tobytes().decode("ascii")
+
+def canonical_string(board_string):
+    # (canonical 81 character string, transform) for an 81 character board string
+    (canonical,transform) = canonical_form(np.frombuffer(board_string[0:81].encode("ascii"),dtype=np.uint8) - ord("0"))
+    return (values_to_string(canonical),transform)
+
+def deduplicate_quizzes(quizzes):
+    # indices of the first quiz of every symmetry class in an (N,81) array
+    seen = set()
+    first_indices = []
+    for i in range(len(quizzes)):
+        key = canonical_form(quizzes[i])[0].tobytes()
+        if key not in seen:
+            seen.add(key)
+            first_indices.append(i)
+    return np.array(first_indices,dtype=int)
+
+
+class SolutionCache:
+    # canonical quiz -> canonical solution, kept in memory and appended to a local
+    # "canonical,solution" file so later runs start warm
+    def __init__(self, path):
+        self.path = path
+        self.solutions = {}
+        self.hits = 0
+        self.misses = 0
+        self.load()
+        self.cache_file = open(path,"a")
+
+    def load(self):
+        self.solutions = {}
+        if os.path.exists(self.path):
+            with open(self.path) as cache_file:
+                for line in cache_file:
+                    if "," in line:
+                        (canonical,solution) = line.strip().split(",")
+                        self.solutions[canonical] = solution
+
+    def get(self, canonical):
+        solution = self.solutions.get(canonical)
+        if solution is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return solution
+
+    def put(self, canonical, solution):
+        if canonical not in self.solutions:
+            self.solutions[canonical] = solution
+            self.cache_file.write(f"{canonical},{solution}\n")
+
+    def lookup(self, board_string):
+        # (solution string mapped back onto board_string or None, canonical string, transform)
+        (canonical,transform) = canonical_string(board_string)
+        cached = self.get(canonical)
+        if cached is None:
+            return (None,canonical,transform)
+        solution = from_canonical(np.frombuffer(cached.encode("ascii"),dtype=np.uint8) - ord("0"),transform)
+        return (values_to_string(solution),canonical,transform)
+
+    def store(self, canonical, transform, solution_string):
+        solution = np.frombuffer(solution_string[0:81].encode("ascii"),dtype=np.uint8) - ord("0")
+        self.put(canonical,values_to_string(to_canonical(solution,transform)))
+
+    def flush(self):
+        # everything stored so far is on disk, for checkpoints
+        self.cache_file.flush()
+        os.fsync(self.cache_file.fileno())
+
+    def position(self):
+        # file offset after the last entry, saved in checkpoints with the hit and miss counts
+        self.cache_file.flush()
+        return self.cache_file.tell()
+
+    def resume(self, position, hits, misses):
+        # back to the state a checkpoint saved: entries stored after it are dropped, so a
+        # resumed run answers the same games from the cache as an uninterrupted one
+        self.cache_file.flush()
+        self.cache_file.truncate(position)
+        self.load()
+        self.hits = hits
+        self.misses = misses
+
+    def close(self):
+        self.cache_file.close()
+
+    def __len__(self):
+        return len(self.solutions)
+
+def play_game(board_string, solution, board_type=SudokuBoard, hidden_singles=False, exact_cover_solver=None, strategies=None):
+    # one corpus game: propagate it (or solve it outright with an exact cover solver). the
+    # result is not checked against solution here: the callers check games in bulk with a GameVerifier
+    with solver_stats.phase("parse"):
+        sb = board_type()
+        sb.initialize_board_from_string(board_string)
+    if exact_cover_solver is not None:
+        with solver_stats.phase("exact_cover"):
+            solved_board = exact_cover_solver.solve(sb)
+        if solved_board is not None:
+            sb = solved_board
+        iterations = 0
+    else:
+        with solver_stats.phase("propagate"):
+            iterations = sb.apply_constraints_iteratively(hidden_singles,strategies)
+    solver_stats.count("games")
+    return (sb,iterations)
+
+def search_unfinished_game(label, board_string, sb, hidden_singles=False, strategies=None):
+    # the search phase of run_many_games (and its shards) for a game propagation left
+    # unfinished: one guess pass, then depth first search. returns the solved board or None
+    starting = 81 - board_string[0:81].count("0")
+    ending = sb.filled_cells()
+    with solver_stats.phase("guess"):
+        guesser = SudokuGuesser(hidden_singles,strategies=strategies)
+        guesser.add_board(sb,None,None)
+        (solution,good_guesses) = guesser.process_board(sb.print_board_string())
+    if solution is not None:
+        print(f"***** {label} solved with one guess_pass")
+        return solution
+    print(f"***** {label} not solved with one guess_pass, but {len(good_guesses)} good guesses exist")
+    print(f"\t{label} started with {starting} cells, and ended with {ending} cells ")
+    guesses_filled_cells = {}
+    for val in [guess.filled_cells() for guess in good_guesses]:
+        if val in guesses_filled_cells:
+            guesses_filled_cells[val] += 1
+        else:
+            guesses_filled_cells[val] = 1
+    print(f"\tGuesses had the following filled_cells histogram:{guesses_filled_cells}")
+    (solution,search_stats) = DepthFirstSolver().solve(sb)
+    if solution is not None:
+        print(f"\t{label} solved with depth first search ({search_stats})")
+    else:
+        print(f"\t{label} has no solution ({search_stats})")
+    return solution
+
+class PuzzleCorpus:
+    # packed binary corpus: a 32 byte header, then fixed size records of 41 bytes of 4-bit cells
+    # per quiz (another 41 for the solution when included). records are fixed size, so the index
+    # of game i is just header_size + i*record_size, and the records are read through np.memmap
+    magic = b"SUSO"
+    version = 1
+    header_dtype = np.dtype([("magic","S4"),("version","<u2"),("has_solutions","<u2"),
+                             ("count","<u8"),("record_size","<u4"),("reserved","V12")])
+    header_size = 32
+    assert(header_dtype.itemsize == header_size)
+
+    def __init__(self, path):
+        header = np.fromfile(path,dtype=PuzzleCorpus.header_dtype,count=1)
+        assert(len(header) == 1 and header["magic"][0] == PuzzleCorpus.magic)
+        assert(header["version"][0] == PuzzleCorpus.version)
+        self.path = path
+        self.count = int(header["count"][0])
+        self.has_solutions = bool(header["has_solutions"][0])
+        self.record_size = int(header["record_size"][0])
+        if self.count > 0:
+            self.records = np.memmap(path,dtype=np.uint8,mode="r",offset=PuzzleCorpus.header_size,shape=(self.count,self.record_size))
+        else:
+            self.records = np.zeros([0,self.record_size],dtype=np.uint8)
+
+    def is_corpus(path):
+        with open(path,"rb") as corpus_file:
+            return corpus_file.read(4) == PuzzleCorpus.magic
+
+    def pack(cells):
+        # (n,81) values -> (n,41) bytes, two cells per byte, high nibble first
+        padded = np.zeros([cells.shape[0],82],dtype=np.uint8)
+        padded[:,0:81] = cells
+        return (padded[:,0::2] << 4) | padded[:,1::2]
+
+    def unpack(packed):
+        cells = np.empty([packed.shape[0],82],dtype=np.uint8)
+        cells[:,0::2] = packed >> 4
+        cells[:,1::2] = packed & 0x0F
+        return cells[:,0:81]
+
+    def header_bytes(count, has_solutions):
+        header = np.zeros([1],dtype=PuzzleCorpus.header_dtype)
+        header["magic"] = PuzzleCorpus.magic
+        header["version"] = PuzzleCorpus.version
+        header["has_solutions"] = has_solutions
+        header["count"] = count
+        header["record_size"] = 82 if has_solutions else 41
+        return header.tobytes()
+
+    def write(path, quizzes, solutions=None):
+        with open(path,"wb") as corpus_file:
+            corpus_file.write(PuzzleCorpus.header_bytes(len(quizzes),solutions is not None))
+            PuzzleCorpus.append(corpus_file,quizzes,solutions)
+
+    def append(corpus_file, quizzes, solutions=None):
+        records = PuzzleCorpus.pack(quizzes)
+        if solutions is not None:
+            records = np.hstack([records,PuzzleCorpus.pack(solutions)])
+        corpus_file.write(records.tobytes())
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        # an int gives one (81,) quiz, a slice gives (n,81); solutions are None if not stored
+        records = self.records[index]
+        single = (records.ndim == 1)
+        records = np.asarray(records).reshape([-1,self.record_size])
+        quizzes = PuzzleCorpus.unpack(records[:,0:41])
+        solutions = PuzzleCorpus.unpack(records[:,41:82]) if self.has_solutions else None
+        if single:
+            return (quizzes[0],None if solutions is None else solutions[0])
+        return (quizzes,solutions)
+
+def convert_csv_to_corpus(input_path, output_path, include_solutions=True, chunk_size=100000):
+    # stream a "quizzes,solutions" csv into the packed binary format, one chunk at a time
+    count = 0
+    with open(output_path,"wb") as corpus_file:
+        corpus_file.write(bytes(PuzzleCorpus.header_size))
+        for (quizzes,solutions) in load_puzzle_chunks(input_path,chunk_size):
+            PuzzleCorpus.append(corpus_file,quizzes,solutions if include_solutions else None)
+            count += len(quizzes)
+        # the count is only known at the end
+        corpus_file.seek(0)
+        corpus_file.write(PuzzleCorpus.header_bytes(count,include_solutions))
+    return count
+
+def read_games(input_path):
+    # (board_string, solution) pairs from either a csv or a packed corpus.
+    # solution is None when the corpus was written without solutions
+    for (position,board_string,solution) in read_game_positions(input_path):
+        yield (board_string,solution)
+
+def read_game_positions(input_path, start=None):
+    # read_games, plus the position just after each game: a byte offset into a csv, or the
+    # index of the next game in a corpus. reading resumes from start, a position given earlier
+    if PuzzleCorpus.is_corpus(input_path):
+        corpus = PuzzleCorpus(input_path)
+        for i in range(0 if start is None else start,len(corpus)):
+            (quiz,solution) = corpus[i]
+            board_string = (quiz + ord("0")).tobytes().decode("ascii")
+            yield (i + 1,board_string,None if solution is None else (solution + ord("0")).tobytes().decode("ascii"))
+        return
+    with open(input_path,"rb") as game_file:
+        header = game_file.readline()
+        if start is not None:
+            game_file.seek(start)
+        while True:
+            game = game_file.readline().decode("ascii")
+            try:
+                board_string, solution = game.split(",")[0:2]
+            except ValueError:
+                return
+            yield (game_file.tell(),board_string,solution)
+
+def load_puzzle_chunks(input_path, chunk_size=100000, count=None):
+    # memory map a "quizzes,solutions" csv with fixed width lines and yield (quizzes, solutions)
+    # as (n,81) uint8 arrays of at most chunk_size games, without a python loop over the games.
+    # a packed corpus is sliced directly instead
+    if PuzzleCorpus.is_corpus(input_path):
+        corpus = PuzzleCorpus(input_path)
+        games = len(corpus) if count is None else min(len(corpus),count)
+        for first in range(0,games,chunk_size):
+            yield corpus[first:min(first+chunk_size,games)]
+        return
+
+    with open(input_path,"rb") as game_file:
+        game_map = mmap.mmap(game_file.fileno(),0,access=mmap.ACCESS_READ)
+    try:
+        data_start = game_map.find(b"\n") + 1
+        first_end = game_map.find(b"\n",data_start)
+        line_length = (first_end if first_end != -1 else len(game_map)) - data_start + 1
+        record_length = 81 + 1 + 81
+        # the last game may be missing its newline
+        games = (len(game_map) - data_start) // line_length
+        if len(game_map) - data_start - games*line_length >= record_length:
+            games += 1
+        if count is not None:
+            games = min(games,count)
+
+        for first in range(0,games,chunk_size):
+            yield parse_puzzle_records(game_map,data_start + first*line_length,min(chunk_size,games - first),line_length)
+    finally:
+        game_map.close()
+
+def parse_puzzle_records(game_map, offset, rows, line_length):
+    # the views into the map stay local, so only the parsed copies outlive this call
+    record_length = 81 + 1 + 81
+    full_rows = min(rows,(len(game_map) - offset) // line_length)
+    records = np.frombuffer(game_map,dtype=np.uint8,count=full_rows*line_length,offset=offset).reshape([full_rows,line_length])
+    records = records[:,0:record_length]
+    if full_rows < rows:
+        last = np.frombuffer(game_map,dtype=np.uint8,count=record_length,offset=offset + full_rows*line_length)
+        records = np.vstack([records,last.reshape([1,record_length])])
+    assert(np.all(records[:,81] == ord(",")))
+    quizzes = records[:,0:81] - ord("0")
+    solutions = records[:,82:163] - ord("0")
+    return (quizzes,solutions)
+
+def load_puzzles(input_path, count=None):
+    # the whole corpus (or its first count games) as one (quizzes, solutions) pair
+    chunks = list(load_puzzle_chunks(input_path,count=count))
+    if len(chunks) == 0:
+        empty = np.zeros([0,81],dtype=np.uint8)
+        return (empty,empty.copy())
+    return (np.concatenate([quizzes for (quizzes,solutions) in chunks]),
+            np.concatenate([solutions for (quizzes,solutions) in chunks]))
+
+HARD_GAMES_HEADER = "quizzes,solutions,partial,creation_hash\n"
+
+def creation_hashes(values):
+    # SudokuBoard.mark_creation_hash for every board of an (N,81) array
+    values = np.asarray(values).reshape([-1,81]).astype("L")
+    return [hashlib.sha256(board.tobytes(), usedforsecurity=False).hexdigest()[0:8] for board in values]
+
+class GameVerifier:
+    # collects the board play_game returned for each game with its expected solution, and checks
+    # them with verify_solutions every block_size games (and on verify()) instead of one at a time.
+    # a puzzle with several solutions may be solved differently than the corpus says, so a
+    # complete and consistent board from the exact cover solver passes as well
+    def __init__(self, block_size=10000, mismatched_games=None):
+        self.block_size = block_size
+        self.boards = []
+        self.solutions = []
+        self.games = []
+        self.solved_elsewhere = []
+        # every game found so far that disagrees with its solution, as given to add()
+        self.mismatched_games = [] if mismatched_games is None else list(mismatched_games)
+
+    def add(self, game, board, solution, solved_elsewhere=False):
+        self.boards.append(board_key(board))
+        self.solutions.append("0"*81 if solution is None else solution[0:81])
+        self.games.append(game)
+        self.solved_elsewhere.append(solved_elsewhere)
+        if len(self.games) >= self.block_size:
+            self.verify()
+
+    def verify(self):
+        # checks the games added since the last call, and returns the ones that disagree
+        if len(self.games) == 0:
+            return []
+        with solver_stats.phase("check"):
+            solved = np.frombuffer(b"".join(self.boards),dtype=np.uint8).reshape([-1,81])
+            report = verify_solutions(solved,quizzes_from_strings(self.solutions))
+            mismatched = [self.games[k] for k in np.flatnonzero(report.mismatched & ~np.array(self.solved_elsewhere))]
+        solver_stats.count("solution_mismatches",len(mismatched))
+        self.mismatched_games.extend(mismatched)
+        self.boards = []
+        self.solutions = []
+        self.games = []
+        self.solved_elsewhere = []
+        return mismatched
+
+    def report(self, label):
+        if len(self.mismatched_games) > 0:
+            print(f"***** {len(self.mismatched_games)} games disagree with their solution, first {label}: {self.mismatched_games[0:10]}")
+
+class HardGameWriter:
+    # fixed width "quiz,solution,partial,creation_hash" lines, so load_puzzle_chunks can still
+    # map the first two columns. a block of games is formatted as one array and written through
+    # a large buffer. unknown solutions are written as 81 zeros
+    def __init__(self, path="boards/hardgames.csv", buffer_size=1 << 20, resume_position=None, resume_games=0):
+        # resume_position (from position()) continues an interrupted file, dropping anything
+        # written after that point
+        if resume_position is None:
+            self.hard_file = open(path,"wb",buffering=buffer_size)
+            self.hard_file.write(HARD_GAMES_HEADER.encode("ascii"))
+        else:
+            self.hard_file = open(path,"r+b",buffering=buffer_size)
+            self.hard_file.truncate(resume_position)
+            self.hard_file.seek(resume_position)
+        self.games = resume_games
+
+    def position(self):
+        # flushed first, so everything before the position is on disk
+        self.hard_file.flush()
+        return self.hard_file.tell()
+
+    def write_games(self, quizzes, solutions, partials, hashes=None):
+        quizzes = np.asarray(quizzes,dtype=np.uint8).reshape([-1,81])
+        count = quizzes.shape[0]
+        if count == 0:
+            return
+        partials = np.asarray(partials,dtype=np.uint8).reshape([count,81])
+        if solutions is None:
+            solutions = np.zeros([count,81],dtype=np.uint8)
+        solutions = np.asarray(solutions,dtype=np.uint8).reshape([count,81])
+        if hashes is None:
+            # the hash of the quiz, as mark_creation_hash on the freshly loaded board gives
+            hashes = creation_hashes(quizzes)
+        separator = np.full([count,1],ord(","),dtype=np.uint8)
+        hash_bytes = np.frombuffer("".join(hashes).encode("ascii"),dtype=np.uint8).reshape([count,8])
+        newline = np.full([count,1],ord("\n"),dtype=np.uint8)
+        rows = np.hstack([quizzes + ord("0"),separator,solutions + ord("0"),separator,partials + ord("0"),separator,hash_bytes,newline])
+        self.hard_file.write(rows.tobytes())
+        self.games += count
+
+    def write_board(self, board_string, solution, board):
+        # one game that board (the propagated state of board_string) did not finish. the board
+        # itself is left alone
+        self.write_games(quizzes_from_strings([board_string]),
+                         None if solution is None else quizzes_from_strings([solution]),
+                         np.asarray(board.known_values).reshape([1,81]))
+
+    def close(self):
+        self.hard_file.close()
+
+def read_hard_games(hard_path="boards/hardgames.csv"):
+    # (board_string, solution or None, partial board string, creation_hash) for every game
+    # written by HardGameWriter
+    with open(hard_path) as hard_file:
+        header = hard_file.readline()
+        for line in hard_file:
+            fields = line.strip().split(",")
+            if len(fields) < 4:
+                return
+            (board_string,solution,partial,creation_hash) = fields[0:4]
+            yield (board_string,None if solution == "0"*81 else solution,partial,creation_hash)
+
+def write_checkpoint(checkpoint_path, checkpoint):
+    # written to a temporary file and renamed, so a crash never leaves half a checkpoint
+    temporary_path = checkpoint_path + ".tmp"
+    with open(temporary_path,"w") as checkpoint_file:
+        json.dump(checkpoint,checkpoint_file)
+        checkpoint_file.flush()
+        os.fsync(checkpoint_file.fileno())
+    os.replace(temporary_path,checkpoint_path)
+
+def read_checkpoint(checkpoint_path):
+    if not os.path.exists(checkpoint_path):
+        return None
+    with open(checkpoint_path) as checkpoint_file:
+        return json.load(checkpoint_file)
+
+def run_many_games(count, board_type=SudokuBoard, hidden_singles=False, engine="propagation", input_path="boards/finnish.csv", stats_sink=None, solution_cache=None,
+                   hard_path="boards/hardgames.csv", checkpoint_path=None, checkpoint_every=10000, resume=False, strategies=None):
+    # engine is "propagation" (constraints, then guessing) or "dlx" (ExactCoverSolver).
+    # strategies adds logical strategies from STRATEGY_CHAIN to the propagation.
+    # stats_sink (e.g. an AggregatingSolverStats) is installed for the run and reported at the end.
+    # solution_cache (a SolutionCache) answers puzzles symmetric to ones already solved, and
+    # remembers every puzzle solved here by search.
+    # with checkpoint_path, the input position, the bincounts so far, the hard game file
+    # position and the solution cache state are saved every checkpoint_every games; resume=True continues from that
+    # checkpoint (if there is one) and ends with the same report as an uninterrupted run.
+    # returns (final_bincount, iterations_bincount)
+    assert(engine in ["propagation","dlx"])
+    previous_stats = set_solver_stats(stats_sink) if stats_sink is not None else None
+    if engine == "dlx":
+        exact_cover_solver = ExactCoverSolver()
+
+    checkpoint = read_checkpoint(checkpoint_path) if (resume and checkpoint_path is not None) else None
+    if checkpoint is not None:
+        assert(checkpoint["input_path"] == input_path and checkpoint["count"] == count)
+        first_game = checkpoint["next_game"]
+        position = checkpoint["position"]
+        final_counts = np.array(checkpoint["final_bincount"],dtype=int)
+        iteration_counts = np.array(checkpoint["iterations_bincount"],dtype=int)
+        previous_elapsed = checkpoint["elapsed"]
+        hard_game_writer = HardGameWriter(hard_path,resume_position=checkpoint["hard_position"],resume_games=checkpoint["hard_games"])
+        verifier = GameVerifier(checkpoint_every,checkpoint["mismatched_games"])
+        if solution_cache is not None:
+            assert("cache_position" in checkpoint), "the checkpoint was written by a run without a solution cache"
+            solution_cache.resume(checkpoint["cache_position"],checkpoint["cache_hits"],checkpoint["cache_misses"])
+        print(f"Resuming at game {first_game}")
+    else:
+        first_game = 0
+        position = None
+        # running bincounts instead of per game arrays, so they fit in a checkpoint
+        final_counts = np.zeros([82],dtype=int)
+        iteration_counts = np.zeros([1],dtype=int)
+        previous_elapsed = 0.0
+        hard_game_writer = HardGameWriter(hard_path)
+        verifier = GameVerifier(checkpoint_every)
+    games = read_game_positions(input_path,position)
 
-    final_filled_array = np.zeros([count],dtype=int)
-    iterations_array = np.zeros([count],dtype=int)
-    
     start_time = time.time()
 
-    for i in range(count):
-        game = game_file.readline()
+    i = first_game
+    for i in range(first_game,count):
+        if checkpoint_path is not None and i > first_game and i % checkpoint_every == 0:
+            # the cache goes to disk first, so a resumed run finds the games solved before this point
+            # (and only those: entries past cache_position are dropped on resume). the games since
+            # the last block are verified, so the mismatches so far go into the checkpoint too
+            verifier.verify()
+            checkpoint = {"input_path": input_path,
+                          "count": count,
+                          "next_game": i,
+                          "position": position,
+                          "final_bincount": final_counts.tolist(),
+                          "iterations_bincount": iteration_counts.tolist(),
+                          "hard_position": hard_game_writer.position(),
+                          "hard_games": hard_game_writer.games,
+                          "mismatched_games": verifier.mismatched_games,
+                          "elapsed": previous_elapsed + time.time() - start_time}
+            if solution_cache is not None:
+                solution_cache.flush()
+                checkpoint.update({"cache_position": solution_cache.position(),
+                                   "cache_hits": solution_cache.hits,
+                                   "cache_misses": solution_cache.misses})
+            write_checkpoint(checkpoint_path,checkpoint)
         try:
-            board_string, solution = game.split(",")
-        except ValueError:
+            (position,board_string,solution) = next(games)
+        except StopIteration:
             print("Ran out of games in input file")
             break
-        sb = SudokuBoard()
-        sb.initialize_board_from_string(board_string)
-        starting = sb.filled_cells()
-        iterations = sb.apply_constraints_iteratively()
+        if engine == "dlx":
+            (sb,iterations) = play_game(board_string,solution,board_type,exact_cover_solver=exact_cover_solver)
+        else:
+            (sb,iterations) = play_game(board_string,solution,board_type,hidden_singles,strategies=strategies)
+        verifier.add(i,sb,solution,engine == "dlx" and sb.unfilled_cells() == 0 and not sb.contradicted())
         ending = sb.filled_cells()
-        assert(sb.check_solution_string(solution))
-        final_filled_array[i] = ending
-        iterations_array[i] = iterations
-        
+        final_counts[ending] += 1
+        if iterations >= len(iteration_counts):
+            iteration_counts = np.pad(iteration_counts,(0,iterations + 1 - len(iteration_counts)))
+        iteration_counts[iterations] += 1
+
         if ending != 81:
-            guesser = SudokuGuesser()
-            guesser.add_board(sb,None,None)
-            (solution,good_guesses) = guesser.process_board(sb.print_board_string())
-            if solution is not None:
-                print(f"***** Board {i} solved with one guess_pass")
-            else:
-                print(f"***** Board {i} not solved with one guess_pass, but {len(good_guesses)} good guesses exist")
-                print(f"\tBoard {i} started with {starting} cells, and ended with {ending} cells ")
-                guesses_filled_cells = {}
-                for val in [guess.filled_cells() for guess in good_guesses]:
-                    if val in guesses_filled_cells:
-                        guesses_filled_cells[val] += 1
-                    else:
-                        guesses_filled_cells[val] = 1
-                print(f"\tGuesses had the following filled_cells histogram:{guesses_filled_cells}")
-                
-        if i % (count // 1000) == 0:
+            # the hard game list depends on the puzzle only, cached or not
+            hard_game_writer.write_board(board_string,solution,sb)
+        if engine == "dlx" and ending != 81:
+            print(f"***** Board {i} has no solution")
+
+        # canonicalizing costs more than propagating, so only the games propagation leaves
+        # unfinished go to the cache. lookup maps the cached solution back through the inverse
+        # transform; a hit that fits the quiz and the expected solution replaces the search.
+        # the bincounts above are the same as in a run without the cache
+        solved = None
+        if solution_cache is not None and ending != 81 and engine == "propagation":
+            with solver_stats.phase("canonicalize"):
+                (cached_solution,canonical,transform) = solution_cache.lookup(board_string)
+            if cached_solution is not None:
+                solved = sb.clone()
+                solved.initialize_board_from_string(cached_solution)
+                if (verify_solutions(np.asarray(solved.known_values).reshape([81]),quizzes_from_strings([board_string])).mismatched[0]
+                        or not solved.check_solution_string(solution)):
+                    print(f"***** Board {i} cached solution does not fit the puzzle, searching instead")
+                    solver_stats.count("cache_mismatches")
+                    solved = None
+                else:
+                    solver_stats.count("cache_hits")
+                    sb = solved
+
+        if ending != 81 and engine == "propagation" and solved is None:
+            solved = search_unfinished_game(f"Board {i}",board_string,sb,hidden_singles,strategies)
+            if solved is not None and solution_cache is not None:
+                solution_cache.store(canonical,transform,solved.print_board_string())
+
+        if i % max(count // 1000,1) == 0:
             print(f"iteration {i}")
 
+    verifier.verify()
     end_time = time.time()
 
-    final_bincount = np.bincount(final_filled_array)   
+    # games never played count as 0 filled cells and 0 iterations, as they always have
+    played = int(np.sum(final_counts))
+    final_counts[0] += count - played
+    iteration_counts[0] += count - played
+
+    # trimmed to the shape np.bincount gives over the per game values
+    final_bincount = final_counts[0:np.max(np.flatnonzero(final_counts),initial=0)+1]
     print(f"Final Results:")
     print(final_bincount)
 
-    iter_bincount  = np.bincount(iterations_array)   
+    iter_bincount = iteration_counts[0:np.max(np.flatnonzero(iteration_counts),initial=0)+1]
     print(f"Iterations:")
     print(iter_bincount)
 
-    elapsed = end_time - start_time
+    elapsed = previous_elapsed + end_time - start_time
     print(f"Processed {i} games in {elapsed:.2f} seconds. ({i/elapsed:.2f} games per second)")
     
-    hard_game_file.close()
+    hard_game_writer.close()
+    print(f"Wrote {hard_game_writer.games} unfinished games to {hard_path}")
+    verifier.report("games")
+    if checkpoint_path is not None and os.path.exists(checkpoint_path):
+        # the run is complete, so a later resume starts from the beginning
+        os.remove(checkpoint_path)
+    if solution_cache is not None:
+        solution_cache.flush()
+        print(f"Solution cache: {solution_cache.hits} hits, {solution_cache.misses} misses, {len(solution_cache)} entries")
+
+    if stats_sink is not None:
+        set_solver_stats(previous_stats)
+        print(stats_sink.report())
+    return (final_bincount,iter_bincount)
+
+def run_many_games_batched(count, batch_size=10000, input_path="boards/finnish.csv", verification_path=None):
+    # same report as run_many_games, but propagation runs through solve_batch and the results
+    # are checked batch by batch with verify_solutions (saved to verification_path if given)
+    final_filled_array = np.zeros([count],dtype=int)
+    iterations_array = np.zeros([count],dtype=int)
+    reports = []
+
+    start_time = time.time()
+
+    processed = 0
+    for (quizzes,solutions) in load_puzzle_chunks(input_path,batch_size,count):
+        solved, iterations = solve_batch(quizzes)
+        final_filled_array[processed:processed+len(quizzes)] = np.count_nonzero(solved,axis=1)
+        iterations_array[processed:processed+len(quizzes)] = iterations
+        reports.append(verify_solutions(solved,solutions))
+        processed += len(quizzes)
+        print(f"iteration {processed}")
+    if processed < count:
+        print("Ran out of games in input file")
+    if len(reports) > 0:
+        report = VerificationReport.concatenate(reports)
+        if np.any(report.mismatched):
+            print(f"***** {np.count_nonzero(report.mismatched)} games disagree with their solution, first ones: {report.mismatched_boards()[0:10]}")
+        if verification_path is not None:
+            report.save(verification_path)
+
+    end_time = time.time()
+
+    final_bincount = np.bincount(final_filled_array[0:processed])
+    print(f"Final Results:")
+    print(final_bincount)
+
+    iter_bincount  = np.bincount(iterations_array[0:processed])
+    print(f"Iterations:")
+    print(iter_bincount)
+
+    elapsed = end_time - start_time
+    print(f"Processed {processed} games in {elapsed:.2f} seconds. ({processed/elapsed:.2f} games per second)")
+
+def shard_offsets(input_path, shards):
+    # split the games (everything after the header) into byte ranges of about the same size.
+    # a game belongs to the shard that holds its first byte
+    with open(input_path,"rb") as game_file:
+        header = game_file.readline()
+        data_start = game_file.tell()
+    size = os.path.getsize(input_path)
+    bounds = np.linspace(data_start,size,shards+1).astype(int)
+    return [(int(bounds[i]),int(bounds[i+1])) for i in range(shards) if bounds[i] < bounds[i+1]]
+
+def run_game_shard(input_path, start_offset, end_offset, board_type=SudokuBoard, hidden_singles=False, engine="propagation", collect_stats=False):
+    # worker side of run_many_games_parallel: play every game that starts in [start_offset,end_offset)
+    start_time = time.time()
+    shard_stats = AggregatingSolverStats() if collect_stats else None
+    previous_stats = set_solver_stats(shard_stats) if collect_stats else None
+    exact_cover_solver = ExactCoverSolver() if engine == "dlx" else None
+    final_filled = []
+    iterations_list = []
+    hard_games = []
+    verifier = GameVerifier()
+
+    with open(input_path,"rb") as game_file:
+        header = game_file.readline()
+        if start_offset > game_file.tell():
+            # step back one byte so a game starting exactly at start_offset is kept
+            game_file.seek(start_offset-1)
+            game_file.readline()
+        while game_file.tell() < end_offset:
+            offset = game_file.tell()
+            game = game_file.readline().decode("ascii")
+            try:
+                board_string, solution = game.split(",")[0:2]
+            except ValueError:
+                break
+            (sb,iterations) = play_game(board_string,solution,board_type,hidden_singles,exact_cover_solver)
+            verifier.add(offset,sb,solution,engine == "dlx" and sb.unfilled_cells() == 0 and not sb.contradicted())
+            final_filled.append(sb.filled_cells())
+            iterations_list.append(iterations)
+            if sb.filled_cells() != 81:
+                # the same hard game line and search as run_many_games
+                hard_games.append((offset,board_string,solution,sb.print_board_string()))
+                if engine == "dlx":
+                    print(f"***** Board at byte {offset} has no solution")
+                else:
+                    search_unfinished_game(f"Board at byte {offset}",board_string,sb,hidden_singles)
+    verifier.verify()
+
+    if collect_stats:
+        set_solver_stats(previous_stats)
+    return {"start_offset": start_offset,
+            "stats": shard_stats,
+            "games": len(final_filled),
+            "final_bincount": np.bincount(np.array(final_filled,dtype=int),minlength=82),
+            "iterations_bincount": np.bincount(np.array(iterations_list,dtype=int),minlength=1),
+            "hard_games": hard_games,
+            "mismatched_games": verifier.mismatched_games,
+            "elapsed": time.time() - start_time}
+
+def run_game_shard_arguments(arguments):
+    return run_game_shard(*arguments)
+
+def add_bincounts(total, bincount):
+    if len(bincount) > len(total):
+        total = np.pad(total,(0,len(bincount)-len(total)))
+    total[0:len(bincount)] += bincount
+    return total
+
+def run_many_games_parallel(input_path="boards/finnish.csv", workers=None, board_type=SudokuBoard, hidden_singles=False, engine="propagation", shards_per_worker=4, stats_sink=None,
+                            hard_path="boards/hardgames.csv"):
+    # every game in input_path, split into byte range shards and played in a process pool.
+    # the per-shard bincounts, hard game lists and stats are merged into the run_many_games
+    # report, and the hard games are written to hard_path in input order, as run_many_games does.
+    # returns (final_bincount, iterations_bincount, sorted (byte offset, board_string) hard games)
+    assert(engine in ["propagation","dlx"])
+    if workers is None:
+        workers = os.cpu_count()
+    shards = shard_offsets(input_path,workers*shards_per_worker)
+    arguments = [(input_path,start,end,board_type,hidden_singles,engine,stats_sink is not None) for (start,end) in shards]
+
+    start_time = time.time()
+
+    final_bincount = np.zeros([82],dtype=int)
+    iter_bincount = np.zeros([1],dtype=int)
+    hard_games = []
+    mismatched_games = []
+    games = 0
+    worker_time = 0.0
+    with multiprocessing.Pool(workers) as pool:
+        for result in pool.imap_unordered(run_game_shard_arguments,arguments):
+            final_bincount = add_bincounts(final_bincount,result["final_bincount"])
+            iter_bincount = add_bincounts(iter_bincount,result["iterations_bincount"])
+            hard_games.extend(result["hard_games"])
+            mismatched_games.extend(result["mismatched_games"])
+            games += result["games"]
+            worker_time += result["elapsed"]
+            if stats_sink is not None:
+                stats_sink.merge(result["stats"])
+            print(f"shard at byte {result['start_offset']}: {result['games']} games in {result['elapsed']:.2f} seconds")
+
+    end_time = time.time()
+
+    hard_games = sorted(hard_games)
+    hard_game_writer = HardGameWriter(hard_path)
+    if len(hard_games) > 0:
+        hard_game_writer.write_games(quizzes_from_strings([board_string for (offset,board_string,solution,partial) in hard_games]),
+                                     quizzes_from_strings([solution for (offset,board_string,solution,partial) in hard_games]),
+                                     quizzes_from_strings([partial for (offset,board_string,solution,partial) in hard_games]))
+    hard_game_writer.close()
+    print(f"Wrote {hard_game_writer.games} unfinished games to {hard_path}")
+
+    # trim to the same shape np.bincount gives the sequential run
+    final_bincount = final_bincount[0:np.max(np.flatnonzero(final_bincount),initial=0)+1]
+    iter_bincount = iter_bincount[0:np.max(np.flatnonzero(iter_bincount),initial=0)+1]
+    print(f"Final Results:")
+    print(final_bincount)
+
+    print(f"Iterations:")
+    print(iter_bincount)
+
+    elapsed = end_time - start_time
+    print(f"Processed {games} games in {elapsed:.2f} seconds. ({games/elapsed:.2f} games per second)")
+    print(f"{len(shards)} shards on {workers} workers used {worker_time:.2f} worker seconds")
+    GameVerifier(mismatched_games=sorted(mismatched_games)).report("byte offsets")
+    if stats_sink is not None:
+        print(stats_sink.report())
+    return (final_bincount,iter_bincount,[(offset,board_string) for (offset,board_string,solution,partial) in hard_games])
+
+def triage_games(input_path="boards/finnish.csv", hard_path="boards/hardgames.csv", count=None, chunk_size=100000):
+    # stages 1 and 2 of the triage pipeline: propagate the whole corpus with solve_batch, and
+    # write every game it does not finish (with its partial state) to hard_path for
+    # search_hard_games. returns (final_bincount, iterations_bincount, hard games written)
+    final_bincount = np.zeros([82],dtype=int)
+    iter_bincount = np.zeros([1],dtype=int)
+    hard_game_writer = HardGameWriter(hard_path)
+    try:
+        for (quizzes,solutions) in load_puzzle_chunks(input_path,chunk_size,count):
+            with solver_stats.phase("propagate"):
+                (solved,iterations) = solve_batch(quizzes)
+            (candidates,valid) = batch_candidates(solved)
+            hard = ~(valid & np.all(solved != 0,axis=1))
+            final_bincount = add_bincounts(final_bincount,np.bincount(np.count_nonzero(solved,axis=1),minlength=82))
+            iter_bincount = add_bincounts(iter_bincount,np.bincount(iterations))
+            with solver_stats.phase("write"):
+                hard_game_writer.write_games(quizzes[hard],None if solutions is None else solutions[hard],solved[hard])
+    finally:
+        hard_game_writer.close()
+    solver_stats.count("hard_games",hard_game_writer.games)
+    return (final_bincount,iter_bincount,hard_game_writer.games)
+
+def search_hard_games(hard_path="boards/hardgames.csv", engine="dfs", max_nodes=None):
+    # stage 3: search every game in hard_path, starting from its partial state. returns
+    # a list of (creation_hash, solution string or None), and checks solutions that are known
+    assert(engine in ["dfs","dlx"])
+    exact_cover_solver = ExactCoverSolver() if engine == "dlx" else None
+    results = []
+    for (board_string,solution,partial,creation_hash) in read_hard_games(hard_path):
+        board = BitmaskSudokuBoard()
+        board.initialize_board_from_string(partial)
+        with solver_stats.phase("search"):
+            if engine == "dlx":
+                solved = exact_cover_solver.solve(board)
+            else:
+                (solved,search_stats) = DepthFirstSolver(max_nodes=max_nodes).solve(board)
+        if solved is None:
+            print(f"***** Hard game {creation_hash} has no solution: {board_string}")
+            results.append((creation_hash,None))
+            continue
+        if solution is not None and not solved.check_solution_string(solution):
+            print(f"***** Hard game {creation_hash} solved differently than expected: {solved.print_board_string()}")
+        results.append((creation_hash,solved.print_board_string()))
+    return results
 
 if __name__ == "__main__":        
-    run_many_games(1000000)
+    run_many_games(1000000,checkpoint_path="boards/run_many_games.checkpoint",resume=True)
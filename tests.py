@@ -1,5 +1,11 @@
 import unittest
+import os
+import asyncio
+import tempfile
 import suso
+import benchmark
+import service
+import generator
 import numpy as np
 
 class TestSuso(unittest.TestCase):
@@ -199,7 +205,1067 @@ class TestSuso(unittest.TestCase):
 
         self.assertIsNotNone(solution, "checking all guesses did not yield a solution")
 
-        solved
+    def test_bitmask_board_matches_possibilities_board(self):
+        game_file = open("boards/sudoku_hard.csv")
+        header = game_file.readline()
+        for game in game_file:
+            board_string, solution = game.strip().split(",")
+            for hidden_singles in [False,True]:
+                board = suso.SudokuBoard()
+                board.initialize_board_from_string(board_string)
+                bitmask_board = suso.BitmaskSudokuBoard()
+                bitmask_board.initialize_board_from_string(board_string)
+                general_board = suso.GeneralSudokuBoard()
+                general_board.initialize_board_from_string(board_string)
+                self.assertEqual(board.guesses(), bitmask_board.guesses(), "guesses differ before propagation")
+                self.assertEqual(board.guesses(), general_board.guesses(), "guesses differ before propagation")
+                iterations = board.apply_constraints_iteratively(hidden_singles)
+                self.assertEqual(iterations, bitmask_board.apply_constraints_iteratively(hidden_singles))
+                self.assertEqual(iterations, general_board.apply_constraints_iteratively(hidden_singles))
+                self.assertEqual(board.print_board_string(), bitmask_board.print_board_string())
+                self.assertEqual(board.print_board_string(), general_board.print_board_string())
+                self.assertTrue(bitmask_board.check_solution_string(solution))
+        game_file.close()
+
+    def test_bitmask_board_validity(self):
+        board_string = '002100049400900800800060320700080005050000001063004700201050670006719050080002000'
+        board = suso.BitmaskSudokuBoard()
+        board.initialize_board_from_string(board_string)
+        self.assertTrue(board.valid())
+        board.apply_known_value(1,2,6)
+        self.assertFalse(board.valid())
+        # a duplicate in a row is caught even though every cell still has a candidate
+        board = suso.BitmaskSudokuBoard()
+        board.apply_known_value(0,0,5)
+        board.apply_known_value(0,8,5)
+        self.assertFalse(board.valid())
+
+    def test_bitmask_board_with_guesser(self):
+        board_string = '002100049400900800800060320700080005050000001063004700201050670006719050080002000'
+        board = suso.BitmaskSudokuBoard()
+        board.initialize_board_from_string(board_string)
+        board.apply_constraints_iteratively()
+
+        guesser = suso.SudokuGuesser()
+        guesser.add_board(board,None,None)
+        (solution,good_guesses) = guesser.process_board(board.print_board_string())
+        self.assertIsNotNone(solution, "checking all guesses did not yield a solution")
+        self.assertEqual(solution.filled_cells(), 81)
+
+    def test_solve_batch_matches_boards(self):
+        game_file = open("boards/sudoku_hard.csv")
+        header = game_file.readline()
+        games = [game.strip().split(",") for game in game_file]
+        game_file.close()
+
+        quizzes = suso.quizzes_from_strings([game[0] for game in games])
+        solved, iterations = suso.solve_batch(quizzes)
+        self.assertEqual(solved.shape, (len(games),81))
+        for i in range(len(games)):
+            board = suso.BitmaskSudokuBoard()
+            board.initialize_board_from_string(games[i][0])
+            self.assertEqual(iterations[i], board.apply_constraints_iteratively())
+            self.assertTrue(np.array_equal(solved[i], board.cells), f"board {i} differs")
+
+    def test_solve_batch_contradiction(self):
+        quizzes = np.zeros([2,81],dtype=np.uint8)
+        quizzes[0][0] = 5
+        quizzes[0][8] = 5
+        solved, iterations = suso.solve_batch(quizzes)
+        self.assertEqual(iterations[0], 0, "a contradicted board should not be propagated")
+        self.assertEqual(iterations[1], 1, "an empty board makes one pass without progress")
+
+    def test_constraint_matrix(self):
+        self.assertEqual(suso.SudokuBoard.constraint_matrix.shape, (324,729))
+        # every possibility is in exactly one row, column, cell and neighborhood constraint
+        self.assertTrue(np.all(np.sum(suso.SudokuBoard.constraint_matrix,axis=0) == 4))
+
+    def test_hidden_singles_simple(self):
+        # 1 is blocked from the first row of the first neighborhood except in cell (0,0)
+        known_values = np.zeros([9,9],dtype=np.uint)
+        known_values[1][4] = 1
+        known_values[2][7] = 1
+        known_values[4][1] = 1
+        known_values[7][2] = 1
+
+        naked_values = suso.SudokuBoard.find_implied_cells(known_values)
+        self.assertEqual(naked_values[0][0],0,"(0,0) is not a naked single")
+        hidden_values = suso.SudokuBoard.find_implied_cells(known_values,hidden_singles=True)
+        self.assertEqual(hidden_values[0][0],1,"the hidden single at (0,0) was not found")
+
+    def test_hidden_singles_solve_hard_boards(self):
+        game_file = open("boards/sudoku_hard.csv")
+        header = game_file.readline()
+        for game in game_file:
+            board_string, solution = game.strip().split(",")
+            for board_type in [suso.SudokuBoard, suso.BitmaskSudokuBoard]:
+                board = board_type()
+                board.initialize_board_from_string(board_string)
+                board.apply_constraints_iteratively(hidden_singles=True)
+                self.assertTrue(board.check_solution_string(solution))
+                self.assertEqual(board.filled_cells(), 81, f"{board_string} was not solved by {board_type.__name__}")
+        game_file.close()
+
+    def test_depth_first_solver(self):
+        board = suso.SudokuBoard()
+        board.import_file(open("boards/20230803_hard_nyt.txt"))
+        (solution,stats) = suso.DepthFirstSolver().solve(board)
+        self.assertIsNotNone(solution, "depth first search did not solve the board")
+        self.assertIsInstance(solution, suso.SudokuBoard)
+        self.assertEqual(solution.filled_cells(), 81)
+        self.assertTrue(solution.valid())
+        # the givens are kept
+        givens = board.get_board() != 0
+        self.assertTrue(np.array_equal(solution.get_board()[givens], board.get_board()[givens]))
+        self.assertGreater(stats.nodes, 1)
+        self.assertGreater(stats.max_depth, 0)
+
+    def test_depth_first_solver_hard_boards(self):
+        game_file = open("boards/sudoku_hard.csv")
+        header = game_file.readline()
+        for game in game_file:
+            board_string, solution = game.strip().split(",")
+            board = suso.BitmaskSudokuBoard()
+            board.initialize_board_from_string(board_string)
+            (solved_board,stats) = suso.DepthFirstSolver().solve(board)
+            self.assertEqual(solved_board.print_board_string(), solution)
+        game_file.close()
+
+    def test_depth_first_solver_unsolvable_and_budget(self):
+        board = suso.SudokuBoard()
+        board.import_file(open("boards/input_sudoku.txt"))
+        (solution,stats) = suso.DepthFirstSolver().solve(board)
+        self.assertIsNone(solution, "a board with duplicate givens has no solution")
+        self.assertFalse(stats.budget_exhausted)
+
+        (solution,stats) = suso.DepthFirstSolver(max_nodes=5).solve(suso.SudokuBoard())
+        self.assertIsNone(solution)
+        self.assertTrue(stats.budget_exhausted)
+        self.assertEqual(stats.nodes, 5)
+
+    def test_exact_cover_solver(self):
+        solver = suso.ExactCoverSolver()
+        game_file = open("boards/sudoku_hard.csv")
+        header = game_file.readline()
+        for game in game_file:
+            board_string, solution = game.strip().split(",")
+            board = suso.SudokuBoard()
+            board.initialize_board_from_string(board_string)
+            # the same solver is reused for every puzzle
+            self.assertEqual(solver.solve(board).print_board_string(), solution)
+        game_file.close()
+
+        board = suso.SudokuBoard()
+        board.import_file(open("boards/input_sudoku.txt"))
+        self.assertIsNone(solver.solve(board), "duplicate givens have no exact cover")
+
+    def test_exact_cover_counting(self):
+        solver = suso.ExactCoverSolver()
+        board = suso.SudokuBoard()
+        board.import_file(open("boards/20230803_hard_nyt_modified.txt"))
+        self.assertEqual(solver.count_solutions(board,limit=2), 1)
+        self.assertEqual(len(solver.enumerate_solutions(board)), 1)
+
+        empty_board = suso.SudokuBoard()
+        self.assertEqual(solver.count_solutions(empty_board,limit=50), 50)
+        solutions = solver.find_solutions(empty_board,limit=3)
+        self.assertEqual(len(set(solutions)), 3)
+        for solution in solutions:
+            solved_board = suso.BitmaskSudokuBoard()
+            solved_board.initialize_board_from_string(solution)
+            self.assertTrue(solved_board.valid())
+            self.assertEqual(solved_board.filled_cells(), 81)
+
+    def test_shards_cover_every_game(self):
+        game_file = open("boards/sudoku_hard.csv")
+        header = game_file.readline()
+        games = [game.strip().split(",") for game in game_file]
+        game_file.close()
+
+        expected_filled = []
+        for board_string, solution in games:
+            (sb,iterations) = suso.play_game(board_string,solution)
+            expected_filled.append(sb.filled_cells())
+
+        # odd shard counts put boundaries in the middle of lines
+        for shards in [1,3,7,100]:
+            results = [suso.run_game_shard("boards/sudoku_hard.csv",start,end)
+                       for (start,end) in suso.shard_offsets("boards/sudoku_hard.csv",shards)]
+            self.assertEqual(sum([result["games"] for result in results]), len(games))
+            final_bincount = np.zeros([82],dtype=int)
+            for result in results:
+                final_bincount = suso.add_bincounts(final_bincount,result["final_bincount"])
+            self.assertTrue(np.array_equal(final_bincount, np.bincount(expected_filled,minlength=82)))
+
+    def test_run_many_games_parallel(self):
+        with tempfile.TemporaryDirectory() as directory:
+            hard_path = os.path.join(directory,"hardgames.csv")
+            (final_bincount,iter_bincount,hard_games) = suso.run_many_games_parallel("boards/sudoku_hard.csv",workers=2,hidden_singles=True,hard_path=hard_path)
+        self.assertEqual(final_bincount[81], 41)
+        self.assertEqual(np.sum(iter_bincount), 41)
+        self.assertEqual(hard_games, [])
+
+    def test_run_many_games_parallel_matches_run_many_games(self):
+        # naked singles alone leave games for the search, so both paths write hard games
+        with tempfile.TemporaryDirectory() as directory:
+            paths = [os.path.join(directory,"sequential.csv"),os.path.join(directory,"parallel.csv")]
+            (final_bincount,iter_bincount) = suso.run_many_games(41,input_path="boards/sudoku_hard.csv",hard_path=paths[0])
+            (parallel_final,parallel_iter,hard_games) = suso.run_many_games_parallel("boards/sudoku_hard.csv",workers=2,hard_path=paths[1])
+            self.assertTrue(np.array_equal(parallel_final,final_bincount))
+            self.assertTrue(np.array_equal(parallel_iter,iter_bincount))
+            with open(paths[0],"rb") as sequential_file, open(paths[1],"rb") as parallel_file:
+                sequential_games = sequential_file.read()
+                self.assertEqual(parallel_file.read(),sequential_games)
+            self.assertEqual(len(hard_games),len(sequential_games.splitlines()) - 1)
+            self.assertGreater(len(hard_games),0)
+
+    def test_load_puzzles(self):
+        game_file = open("boards/sudoku_hard.csv")
+        header = game_file.readline()
+        games = [game.strip().split(",") for game in game_file]
+        game_file.close()
+
+        (quizzes,solutions) = suso.load_puzzles("boards/sudoku_hard.csv")
+        self.assertEqual(quizzes.shape, (len(games),81))
+        self.assertEqual(quizzes.dtype, np.uint8)
+        self.assertTrue(np.array_equal(quizzes, suso.quizzes_from_strings([game[0] for game in games])))
+        self.assertTrue(np.array_equal(solutions, suso.quizzes_from_strings([game[1] for game in games])))
+
+        # finnish.csv has no newline after its last game
+        (quizzes,solutions) = suso.load_puzzles("boards/finnish.csv")
+        self.assertEqual(quizzes.shape, (1,81))
+        self.assertEqual(quizzes[0][0], 8)
+
+    def test_load_puzzle_chunks(self):
+        chunks = list(suso.load_puzzle_chunks("boards/sudoku_hard.csv",chunk_size=16,count=40))
+        self.assertEqual([len(quizzes) for (quizzes,solutions) in chunks], [16,16,8])
+        (quizzes,solutions) = suso.load_puzzles("boards/sudoku_hard.csv")
+        self.assertTrue(np.array_equal(np.concatenate([chunk[1] for chunk in chunks]), solutions[0:40]))
+
+    def test_puzzle_corpus_round_trip(self):
+        (quizzes,solutions) = suso.load_puzzles("boards/sudoku_hard.csv")
+        with tempfile.TemporaryDirectory() as directory:
+            corpus_path = os.path.join(directory,"sudoku_hard.suso")
+            self.assertEqual(suso.convert_csv_to_corpus("boards/sudoku_hard.csv",corpus_path,chunk_size=10), len(quizzes))
+            self.assertEqual(os.path.getsize(corpus_path), 32 + 82*len(quizzes))
+            self.assertTrue(suso.PuzzleCorpus.is_corpus(corpus_path))
+            self.assertFalse(suso.PuzzleCorpus.is_corpus("boards/sudoku_hard.csv"))
+
+            corpus = suso.PuzzleCorpus(corpus_path)
+            self.assertEqual(len(corpus), len(quizzes))
+            (quiz,solution) = corpus[17]
+            self.assertTrue(np.array_equal(quiz, quizzes[17]))
+            self.assertTrue(np.array_equal(solution, solutions[17]))
+            (slice_quizzes,slice_solutions) = corpus[10:30:3]
+            self.assertTrue(np.array_equal(slice_quizzes, quizzes[10:30:3]))
+            self.assertTrue(np.array_equal(slice_solutions, solutions[10:30:3]))
+
+            quiz_path = os.path.join(directory,"quizzes_only.suso")
+            suso.PuzzleCorpus.write(quiz_path,quizzes)
+            quiz_corpus = suso.PuzzleCorpus(quiz_path)
+            self.assertIsNone(quiz_corpus[0][1])
+            self.assertTrue(np.array_equal(quiz_corpus[:][0], quizzes))
+
+    def test_read_games_from_corpus(self):
+        with tempfile.TemporaryDirectory() as directory:
+            corpus_path = os.path.join(directory,"sudoku_hard.suso")
+            suso.convert_csv_to_corpus("boards/sudoku_hard.csv",corpus_path)
+            csv_games = [(board_string,solution.strip()) for (board_string,solution) in suso.read_games("boards/sudoku_hard.csv")]
+            self.assertEqual(list(suso.read_games(corpus_path)), csv_games)
+            for (board_string,solution) in suso.read_games(corpus_path):
+                (sb,iterations) = suso.play_game(board_string,solution,suso.BitmaskSudokuBoard,hidden_singles=True)
+                self.assertEqual(sb.print_board_string(), solution)
+
+    def test_unit_and_peer_tables(self):
+        self.assertEqual(suso.UNITS.shape, (27,9))
+        # every cell is in exactly three units, and CELL_UNITS names them
+        self.assertTrue(np.array_equal(np.bincount(suso.UNITS.reshape([243]),minlength=81), np.full([81],3)))
+        for cell in range(81):
+            for unit in suso.CELL_UNITS[cell]:
+                self.assertIn(cell, suso.UNITS[unit])
+        self.assertEqual(suso.PEERS.shape, (81,20))
+        self.assertNotIn(0, suso.PEERS[0])
+        self.assertTrue(set([1,8,9,72,10,20]).issubset(set(suso.PEERS[0])))
+        self.assertNotIn(30, suso.PEERS[0])
+
+    def test_vectorized_possibilities_match_cell_loop(self):
+        rng = np.random.default_rng(2023)
+        for trial in range(200):
+            # random boards, including ones with duplicated values in a unit
+            known_values = rng.integers(0,10,size=[9,9]) * (rng.random([9,9]) < rng.random())
+            expected = np.ones([9,9,9],dtype=bool)
+            for row in range(9):
+                for col in range(9):
+                    if known_values[row][col] != 0:
+                        suso.SudokuBoard.apply_known_cell_to_possibilities(row,col,int(known_values[row][col]),expected)
+            possibilities = suso.SudokuBoard.convert_known_values_to_possibilities(known_values)
+            self.assertTrue(np.array_equal(possibilities, expected), f"trial {trial} differs")
+
+    def test_live_possibilities(self):
+        board_string = '002100049400900800800060320700080005050000001063004700201050670006719050080002000'
+        board = suso.SudokuBoard()
+        board.initialize_board_from_string(board_string)
+        self.assertTrue(np.array_equal(board.possibilities, suso.SudokuBoard.convert_known_values_to_possibilities(board.known_values)))
+
+        # incremental updates, an overwrite and a duplicate all match a rebuild
+        for (row,col,value) in [(0,0,3),(0,1,5),(0,1,6),(0,4,3)]:
+            board.apply_known_value(row,col,value)
+            expected = suso.SudokuBoard.convert_known_values_to_possibilities(board.known_values)
+            self.assertTrue(np.array_equal(board.possibilities, expected), f"stale after setting ({row},{col})={value}")
+
+        # writes straight into known_values are picked up too
+        board.known_values[8][8] = 0
+        board.known_values[8][0] = 0
+        expected = suso.SudokuBoard.convert_known_values_to_possibilities(board.known_values)
+        self.assertTrue(np.array_equal(board.possibilities, expected))
+
+    def test_guess_uses_live_possibilities(self):
+        board_string = '002100049400900800800060320700080005050000001063004700201050670006719050080002000'
+        board = suso.SudokuBoard()
+        board.initialize_board_from_string(board_string)
+        self.assertEqual(board.possibilities_sum(), np.sum(suso.SudokuBoard.convert_known_values_to_possibilities(board.known_values)))
+        (guess_board,guess) = board.guess(0)
+        self.assertEqual(guess, (0,0,3))
+        self.assertEqual(guess_board.get_board()[0][0], 3)
+        self.assertEqual(board.get_board()[0][0], 0, "guessing must not change the original board")
+
+    def test_incremental_propagation_matches_rebuild(self):
+        game_file = open("boards/sudoku_hard.csv")
+        header = game_file.readline()
+        for game in game_file:
+            board_string, solution = game.strip().split(",")
+            for hidden_singles in [False,True]:
+                board = suso.SudokuBoard()
+                board.initialize_board_from_string(board_string)
+                known_values = board.known_values.copy()
+                iterations = 0
+                starting = 0
+                ending = 81
+                while (starting < ending) and (np.min(np.sum(suso.SudokuBoard.convert_known_values_to_possibilities(known_values),axis=2)) != 0):
+                    starting = np.count_nonzero(known_values)
+                    known_values = suso.SudokuBoard.find_implied_cells(known_values,hidden_singles)
+                    iterations += 1
+                    ending = np.count_nonzero(known_values)
+                self.assertEqual(board.apply_constraints_iteratively(hidden_singles), iterations)
+                self.assertTrue(np.array_equal(board.known_values, known_values))
+        game_file.close()
+
+    def test_benchmark_stages_and_summary(self):
+        board_string = '002100049400900800800060320700080005050000001063004700201050670006719050080002000'
+        times = benchmark.run_stages(board_string)
+        self.assertEqual(sorted(times.keys()), sorted(benchmark.STAGES))
+        # a board propagation solves never reaches the guess stage
+        solved_string = '346179258187523964529648371965832417472916835813754629798261543631485792254397186'
+        self.assertNotIn("guess", benchmark.run_stages(solved_string))
+
+        summary = benchmark.summarize([1.0,2.0,3.0,4.0])
+        self.assertEqual(summary["count"], 4)
+        self.assertAlmostEqual(summary["p50"], 2.5)
+        self.assertAlmostEqual(summary["total"], 10.0)
+
+        results = benchmark.run_benchmark({"one": [board_string]},memory=True)
+        self.assertEqual(results["sets"]["one"]["boards"], 1)
+        self.assertGreater(results["sets"]["one"]["stages"]["propagate"]["peak_bytes"], 0)
+
+    def test_benchmark_baseline_comparison(self):
+        baseline = {"sets": {"hard": {"stages": {"parse": {"p50": 1.0},"guess": {"p50": 1.0}}}}}
+        results = {"sets": {"hard": {"stages": {"parse": {"p50": 1.1},"guess": {"p50": 1.5},"convert": {"p50": 9.0}}},
+                            "new": {"stages": {"parse": {"p50": 5.0}}}}}
+        regressions = benchmark.compare_to_baseline(results,baseline,threshold=0.25)
+        self.assertEqual(regressions, [("hard","guess",1.0,1.5)])
+        self.assertEqual(benchmark.compare_to_baseline(results,baseline,threshold=1.0), [])
+
+    def test_solver_stats_default_is_noop(self):
+        self.assertFalse(suso.solver_stats.enabled)
+        with suso.solver_stats.phase("anything"):
+            suso.solver_stats.count("anything")
+            suso.solver_stats.observe("anything",1)
+
+    def test_aggregating_solver_stats(self):
+        events = []
+        sink = suso.AggregatingSolverStats(trace_hook=lambda event, details: events.append(event))
+        previous = suso.set_solver_stats(sink)
+        try:
+            board_string = '002100049400900800800060320700080005050000001063004700201050670006719050080002000'
+            board = suso.SudokuBoard()
+            board.initialize_board_from_string(board_string)
+            iterations = board.apply_constraints_iteratively()
+            guesser = suso.SudokuGuesser()
+            guesser.add_board(board,None,None)
+            with suso.solver_stats.phase("guess"):
+                (solution,good_guesses) = guesser.process_board(board.print_board_string())
+        finally:
+            suso.set_solver_stats(previous)
+        self.assertIs(suso.solver_stats, previous)
+
+        self.assertEqual(sink.counters["propagation_passes"], sum(sink.histograms["cells_fixed_per_pass"].values()))
+        self.assertEqual(sink.counters["cells_fixed.naked_single"] + sink.counters.get("cells_fixed.hidden_single",0),
+                         sum([fixed*occurrences for fixed, occurrences in sink.histograms["cells_fixed_per_pass"].items()]))
+        self.assertEqual(sink.counters["clones"], sink.counters["guesses_tried"])
+        self.assertGreater(sink.counters["bytes_allocated"], 0)
+        self.assertEqual(sink.phase_calls["guess"], 1)
+        self.assertIn("pass", events)
+        self.assertIn("guess", events)
+
+        merged = suso.AggregatingSolverStats()
+        merged.merge(sink)
+        merged.merge(sink)
+        self.assertEqual(merged.counters["guesses_tried"], 2*sink.counters["guesses_tried"])
+        self.assertIn("guesses_tried", merged.report())
+
+    def test_transposition_table_lru(self):
+        table = suso.TranspositionTable(capacity=2)
+        table[b"a"] = 1
+        table[b"b"] = 2
+        self.assertEqual(table.get(b"a"), 1)
+        # b is now the least recently used entry
+        table[b"c"] = 3
+        self.assertNotIn(b"b", table)
+        self.assertIn(b"a", table)
+        self.assertEqual(len(table), 2)
+        self.assertEqual(table.evictions, 1)
+        self.assertIsNone(table.get(b"b"))
+        with self.assertRaises(KeyError):
+            table[b"b"]
+
+    def test_guesser_records_dead_and_solved_states(self):
+        board_string = '002100049400900800800060320700080005050000001063004700201050670006719050080002000'
+        board = suso.SudokuBoard()
+        board.initialize_board_from_string(board_string)
+        board.apply_constraints_iteratively()
+        self.assertEqual(suso.board_key(board), suso.board_string_key(board.print_board_string()))
+        self.assertEqual(len(suso.board_key(board)), 81)
+
+        guesser = suso.SudokuGuesser(capacity=1000)
+        guesser.add_board(board,None,None)
+        (solution,good_guesses) = guesser.process_board(board.print_board_string())
+        self.assertIsNotNone(solution)
+        self.assertIn(suso.DEAD_BOARD, guesser.outcomes.entries.values())
+
+        # the second expansion reuses the recorded outcomes instead of propagating again
+        sink = suso.AggregatingSolverStats()
+        previous = suso.set_solver_stats(sink)
+        try:
+            (second_solution,second_guesses) = guesser.process_board(board.print_board_string())
+        finally:
+            suso.set_solver_stats(previous)
+        self.assertEqual(second_solution.print_board_string(), solution.print_board_string())
+        self.assertNotIn("guesses_tried", sink.counters)
+        self.assertGreater(sink.counters["transposition_hits"], 0)
+
+    def test_guesser_explore(self):
+        board = suso.SudokuBoard()
+        board.import_file(open("boards/20230803_hard_nyt.txt"))
+        board.apply_constraints_iteratively()
+        guesser = suso.SudokuGuesser(capacity=16)
+        guesser.add_board(board,None,None)
+        solution = guesser.explore(board.print_board_string())
+        self.assertEqual(solution.filled_cells(), 81)
+        self.assertTrue(solution.valid())
+        self.assertLessEqual(len(guesser.outcomes), 16)
+
+    def test_canonical_form_is_shared_by_symmetric_puzzles(self):
+        (quizzes,solutions) = suso.load_puzzles("boards/sudoku_hard.csv")
+        (canonical,transform) = suso.canonical_form(quizzes[0])
+        self.assertTrue(np.array_equal(suso.from_canonical(canonical,transform),quizzes[0]))
+        rng = np.random.default_rng(1)
+        for k in range(3):
+            digits = np.concatenate([[0],rng.permutation(9) + 1]).astype(np.uint8)
+            rows = suso.LINE_PERMUTATIONS[rng.integers(1296)]
+            columns = suso.LINE_PERMUTATIONS[rng.integers(1296)]
+            shuffled = digits[quizzes[0].reshape([9,9]).T[rows][:,columns]].reshape([81])
+            self.assertTrue(np.array_equal(suso.canonical_form(shuffled)[0],canonical))
+
+    def test_solution_cache_maps_solutions_back(self):
+        (quizzes,solutions) = suso.load_puzzles("boards/sudoku_hard.csv")
+        quiz = suso.values_to_string(quizzes[2])
+        solution = suso.values_to_string(solutions[2])
+        shuffled = suso.values_to_string(quizzes[2].reshape([9,9])[::-1].reshape([81]))
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory,"cache.csv")
+            cache = suso.SolutionCache(path)
+            (cached,canonical,transform) = cache.lookup(quiz)
+            self.assertIsNone(cached)
+            cache.store(canonical,transform,solution)
+            cache.close()
+
+            cache = suso.SolutionCache(path)
+            self.assertEqual(len(cache),1)
+            (cached,canonical,transform) = cache.lookup(shuffled)
+            cache.close()
+        board = suso.SudokuBoard()
+        board.initialize_board_from_string(cached)
+        self.assertTrue(board.valid())
+        self.assertEqual(cached,suso.values_to_string(solutions[2].reshape([9,9])[::-1].reshape([81])))
+        self.assertEqual(list(suso.deduplicate_quizzes(np.stack([quizzes[2],quizzes[2].reshape([9,9])[::-1].reshape([81]),quizzes[3]]))),[0,2])
+
+    def test_clone_copies_the_board(self):
+        board_string = "000000010400000000020000000000050407008000300001090000300400200050100000000806000"
+        for board_type in [suso.SudokuBoard, suso.BitmaskSudokuBoard]:
+            board = board_type()
+            board.initialize_board_from_string(board_string)
+            board_copy = board.clone()
+            board_copy.apply_known_value(0,0,6)
+            self.assertEqual(board.print_board_string(),board_string)
+            self.assertEqual(board_copy.print_board_string(),"6" + board_string[1:])
+            fresh = board_type()
+            fresh.initialize_board_from_string("6" + board_string[1:])
+            self.assertEqual(board_copy.guesses(),fresh.guesses())
+        compact = suso.BitmaskSudokuBoard()
+        self.assertFalse(hasattr(compact,"__dict__"))
+        self.assertEqual(suso.board_nbytes(compact),135)
+
+    def test_contradictions_beyond_valid(self):
+        empty = "0"*81
+        # two 5s in the first row
+        duplicate = "55" + "0"*79
+        # the 1s in (1,0) and (2,3) leave no cell in the first row for a 1
+        homeless = list("000000234" + "0"*72)
+        homeless[9] = "1"
+        homeless[21] = "1"
+        homeless = "".join(homeless)
+        for board_type in [suso.SudokuBoard, suso.BitmaskSudokuBoard]:
+            for (board_string,contradicted) in [(empty,False),(duplicate,True),(homeless,True)]:
+                board = board_type()
+                board.initialize_board_from_string(board_string)
+                self.assertEqual(board.contradicted(),contradicted)
+            self.assertTrue(board.valid())
+
+        values = suso.quizzes_from_strings([empty,duplicate,homeless])
+        (candidates,valid) = suso.batch_candidates(values)
+        self.assertEqual(list(suso.unit_contradictions(candidates,values)),[False,True,True])
+
+    def test_explore_parallel_finds_a_solution(self):
+        # two unique rectangles blanked: no single guess finishes the board, so the
+        # solution has to come from a worker
+        board_string = "508710040924653871701840050395287164246195387817364592682971435473528619159436728"
+        for board_type in [suso.SudokuBoard, suso.BitmaskSudokuBoard]:
+            board = board_type()
+            board.initialize_board_from_string(board_string)
+            guesser = suso.SudokuGuesser()
+            guesser.add_board(board,None,None)
+            solution = guesser.explore_parallel(board.print_board_string(),workers=2)
+            self.assertIsInstance(solution,board_type)
+            self.assertEqual(solution.filled_cells(),81)
+            self.assertTrue(solution.valid())
+            self.assertFalse(solution.contradicted())
+            solution_string = solution.print_board_string()
+            self.assertTrue(all([given == "0" or given == value for (given,value) in zip(board_string,solution_string)]))
+
+    def test_service_answers_in_request_order(self):
+        (quizzes,solutions) = suso.load_puzzles("boards/sudoku_hard.csv")
+        board_strings = [suso.values_to_string(quiz) for quiz in quizzes[0:6]]
+        lines = board_strings[0:3] + ["not a puzzle"] + board_strings[3:6]
+
+        class Collector:
+            def __init__(self):
+                self.data = b""
+            def write(self, data):
+                self.data += data
+            async def drain(self):
+                pass
+
+        async def serve():
+            # a small batch size, so the answers come from several batches
+            solver_service = service.SolverService(max_batch=2,max_delay=0)
+            batcher = asyncio.create_task(solver_service.run())
+            reader = asyncio.StreamReader()
+            reader.feed_data(("\n".join(lines) + "\n").encode("ascii"))
+            reader.feed_eof()
+            writer = Collector()
+            await service.serve_stream(solver_service,reader,writer)
+            batcher.cancel()
+            return (writer.data.decode("ascii").splitlines(),solver_service)
+
+        (responses,solver_service) = asyncio.run(serve())
+        expected = [suso.values_to_string(solution) for solution in solutions[0:6]]
+        self.assertEqual(responses,expected[0:3] + ["error: expected 81 digits"] + expected[3:6])
+        self.assertGreater(solver_service.batches,1)
+        summary = solver_service.latency_summary()
+        self.assertEqual(summary["count"],7)
+        self.assertLessEqual(summary["p50"],summary["p99"])
+
+    def test_triage_pipeline_writes_and_searches_hard_games(self):
+        (quizzes,solutions) = suso.load_puzzles("boards/sudoku_hard.csv")
+        with tempfile.TemporaryDirectory() as directory:
+            hard_path = os.path.join(directory,"hardgames.csv")
+            (final_bincount,iter_bincount,hard_games) = suso.triage_games("boards/sudoku_hard.csv",hard_path)
+            self.assertEqual(np.sum(final_bincount),len(quizzes))
+            self.assertEqual(hard_games,len(quizzes) - final_bincount[81])
+
+            hard_rows = list(suso.read_hard_games(hard_path))
+            self.assertEqual(len(hard_rows),hard_games)
+            (board_string,solution,partial,creation_hash) = hard_rows[0]
+            # the hash is the quiz's, not the partial board's
+            board = suso.SudokuBoard()
+            board.initialize_board_from_string(board_string)
+            board.mark_creation_hash()
+            self.assertEqual(board.creation_hash(),creation_hash)
+            board.apply_constraints_iteratively()
+            self.assertEqual(board.print_board_string(),partial)
+
+            # write_board gives the same line, and does not touch the board
+            board = suso.BitmaskSudokuBoard()
+            board.initialize_board_from_string(board_string)
+            board.apply_constraints_iteratively()
+            single_path = os.path.join(directory,"single.csv")
+            writer = suso.HardGameWriter(single_path)
+            writer.write_board(board_string,solution,board)
+            writer.close()
+            self.assertEqual(board.creation_hash(),"")
+            self.assertEqual(list(suso.read_hard_games(single_path)),hard_rows[0:1])
+            # the first two columns still load as a plain quizzes,solutions file
+            (hard_quizzes,hard_solutions) = suso.load_puzzles(hard_path)
+            self.assertEqual(suso.values_to_string(hard_quizzes[0]),board_string)
+
+            results = suso.search_hard_games(hard_path)
+        expected = {suso.values_to_string(quiz): suso.values_to_string(solution) for (quiz,solution) in zip(quizzes,solutions)}
+        for ((board_string,solution,partial,creation_hash),(result_hash,result)) in zip(hard_rows,results):
+            self.assertEqual(result_hash,creation_hash)
+            self.assertEqual(result,expected[board_string])
+
+    def test_run_many_games_resumes_from_checkpoint(self):
+        with tempfile.TemporaryDirectory() as directory:
+            hard_path = os.path.join(directory,"hardgames.csv")
+            checkpoint_path = os.path.join(directory,"checkpoint.json")
+            (final_bincount,iter_bincount) = suso.run_many_games(45,input_path="boards/sudoku_hard.csv",hard_path=hard_path)
+            with open(hard_path,"rb") as hard_file:
+                hard_games = hard_file.read()
+
+            # interrupt the run at game 25, after the checkpoint at game 20
+            play_game = suso.play_game
+            played = []
+            def interrupted_play_game(*arguments, **keywords):
+                if len(played) == 25:
+                    raise KeyboardInterrupt()
+                played.append(arguments[0])
+                return play_game(*arguments,**keywords)
+            suso.play_game = interrupted_play_game
+            try:
+                with self.assertRaises(KeyboardInterrupt):
+                    suso.run_many_games(45,input_path="boards/sudoku_hard.csv",hard_path=hard_path,checkpoint_path=checkpoint_path,checkpoint_every=10,resume=True)
+            finally:
+                suso.play_game = play_game
+            self.assertEqual(suso.read_checkpoint(checkpoint_path)["next_game"],20)
+
+            (resumed_final,resumed_iter) = suso.run_many_games(45,input_path="boards/sudoku_hard.csv",hard_path=hard_path,checkpoint_path=checkpoint_path,checkpoint_every=10,resume=True)
+            self.assertTrue(np.array_equal(resumed_final,final_bincount))
+            self.assertTrue(np.array_equal(resumed_iter,iter_bincount))
+            with open(hard_path,"rb") as hard_file:
+                self.assertEqual(hard_file.read(),hard_games)
+            self.assertFalse(os.path.exists(checkpoint_path))
+
+    def test_count_solutions(self):
+        for (path,expected) in [("boards/20230803_hard_nyt.txt",1),("boards/20230803_hard_nyt_modified.txt",1),("boards/input_sudoku_one_value.txt",2)]:
+            board = suso.SudokuBoard()
+            with open(path) as board_file:
+                board.import_file(board_file)
+            self.assertEqual(board.count_solutions(),expected)
+            bitmask_board = suso.BitmaskSudokuBoard()
+            bitmask_board.initialize_board_from_string(board.print_board_string())
+            self.assertEqual(bitmask_board.count_solutions(),expected)
+
+        # two unique rectangles blanked: four solutions, found in full only without a limit
+        board = suso.SudokuBoard()
+        board.initialize_board_from_string("508710040924653871701840050395287164246195387817364592682971435473528619159436728")
+        self.assertEqual(board.count_solutions(),2)
+        self.assertEqual(board.count_solutions(limit=None),4)
+        self.assertEqual(suso.ExactCoverSolver().count_solutions(board,limit=None),4)
+
+    def test_count_solutions_batch(self):
+        (quizzes,solutions) = suso.load_puzzles("boards/sudoku_hard.csv")
+        quizzes = quizzes[0:5].copy()
+        # an under-constrained board, a contradicted one and a finished one
+        quizzes[1] = suso.quizzes_from_strings(["508710040924653871701840050395287164246195387817364592682971435473528619159436728"])[0]
+        quizzes[2,0:2] = 5
+        quizzes[3] = solutions[3]
+        self.assertEqual(list(suso.count_solutions_batch(quizzes)),[1,2,0,1,1])
+        self.assertEqual(list(suso.count_solutions_batch(quizzes,limit=None)),[1,4,0,1,1])
+        self.assertTrue(np.all(suso.count_corpus_solutions("boards/sudoku_hard.csv") == 1))
+        # boards the node budget cannot settle are marked, not counted as what was found so far;
+        # boards propagation settles need no search
+        counts = suso.count_solutions_batch(quizzes,limit=None,max_nodes=2)
+        self.assertEqual(list(counts[[1,2,3]]),[suso.BUDGET_EXHAUSTED,0,1])
+        for board_type in [suso.SudokuBoard,suso.BitmaskSudokuBoard]:
+            board = board_type()
+            board.initialize_board_from_string(suso.values_to_string(quizzes[1]))
+            self.assertEqual(board.count_solutions(limit=None,max_nodes=2),suso.BUDGET_EXHAUSTED)
+            self.assertEqual(board.count_solutions(limit=None),4)
+
+    def test_generator_makes_unique_puzzles(self):
+        puzzles = generator.generate_puzzles(5,seed=3)
+        self.assertEqual([suso.values_to_string(quiz) for (quiz,solution) in puzzles],
+                         [suso.values_to_string(quiz) for (quiz,solution) in generator.generate_puzzles(5,seed=3)])
+        for (quiz,solution) in puzzles:
+            self.assertTrue(np.all((quiz == 0) | (quiz == solution)))
+            board = suso.BitmaskSudokuBoard()
+            board.initialize_board_from_string(suso.values_to_string(quiz))
+            self.assertEqual(board.count_solutions(),1)
+            # minimal: every remaining clue is needed
+            for cell in np.flatnonzero(quiz):
+                fewer_clues = quiz.copy()
+                fewer_clues[cell] = 0
+                board = suso.BitmaskSudokuBoard()
+                board.initialize_board_from_string(suso.values_to_string(fewer_clues))
+                self.assertEqual(board.count_solutions(),2)
+
+        puzzles = generator.generate_puzzles(3,seed=4,target_clues=30,difficulty="naked_singles")
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory,"generated.csv")
+            generator.write_puzzles(path,puzzles)
+            (quizzes,solutions) = suso.load_puzzles(path)
+        self.assertTrue(np.all(np.count_nonzero(quizzes,axis=1) == 30))
+        self.assertEqual([generator.puzzle_difficulty(quiz) for quiz in quizzes],["naked_singles"]*3)
+        self.assertTrue(np.all(suso.count_solutions_batch(quizzes) == 1))
+
+    def test_general_board_matches_bitmask_board(self):
+        (quizzes,solutions) = suso.load_puzzles("boards/sudoku_hard.csv")
+        for quiz in quizzes[0:10]:
+            for hidden_singles in [False,True]:
+                bitmask_board = suso.BitmaskSudokuBoard()
+                bitmask_board.initialize_board_from_string(suso.values_to_string(quiz))
+                general_board = suso.GeneralSudokuBoard(3)
+                general_board.initialize_board_from_string(suso.values_to_string(quiz))
+                self.assertEqual(general_board.apply_constraints_iteratively(hidden_singles),bitmask_board.apply_constraints_iteratively(hidden_singles))
+                self.assertEqual(general_board.print_board_string(),bitmask_board.print_board_string())
+                self.assertEqual(general_board.guesses(),bitmask_board.guesses())
+
+    def test_general_board_solves_larger_boards(self):
+        for box_size in [4,5]:
+            size = box_size*box_size
+            rows = np.arange(size).reshape([-1,1])
+            cols = np.arange(size).reshape([1,-1])
+            # a valid full grid, with about half of it blanked
+            solution = ((box_size*(rows % box_size) + rows // box_size + cols) % size + 1).astype(np.uint8).reshape([-1])
+            quiz = solution.copy()
+            quiz[np.random.default_rng(0).random(size*size) < 0.5] = 0
+            board_string = suso.BOARD_CHARACTER_BYTES[quiz].tobytes().decode("ascii")
+
+            board = suso.GeneralSudokuBoard(box_size)
+            board.initialize_board_from_string(board_string)
+            self.assertEqual(board.print_board_string(),board_string)
+            self.assertEqual(board.candidates().dtype,np.uint16 if size <= 16 else np.uint32)
+            board.apply_constraints_iteratively(hidden_singles=True)
+            self.assertTrue(board.valid())
+            self.assertEqual(suso.board_from_key(suso.board_key(board),suso.GeneralSudokuBoard).print_board_string(),board.print_board_string())
+            (solved,search_stats) = suso.DepthFirstSolver().solve(board)
+            self.assertIsInstance(solved,suso.GeneralSudokuBoard)
+            self.assertEqual(solved.filled_cells(),size*size)
+            self.assertFalse(solved.contradicted())
+            self.assertTrue(np.all((quiz == 0) | (solved.cells == quiz)))
+            self.assertEqual(board.count_solutions(limit=1),1)
+            if box_size == 4:
+                self.assertEqual(suso.GeneralSudokuBoard(box_size).count_solutions(),2)
+
+            # the exact cover matrix and the canonical form are the 9x9 ones
+            with self.assertRaises(ValueError):
+                suso.ExactCoverSolver().solve(board)
+            with self.assertRaises(ValueError):
+                board.canonical_form()
+
+        board = suso.GeneralSudokuBoard(3)
+        (quizzes,solutions) = suso.load_puzzles("boards/sudoku_hard.csv")
+        board.initialize_board_from_string(suso.values_to_string(quizzes[0]))
+        bitmask_board = suso.BitmaskSudokuBoard()
+        bitmask_board.initialize_board_from_string(board.print_board_string())
+        self.assertTrue(np.array_equal(board.canonical_form()[0],bitmask_board.canonical_form()[0]))
+        self.assertEqual(board.count_solutions(),1)
+        self.assertEqual(suso.ExactCoverSolver().solve(board).print_board_string(),suso.ExactCoverSolver().solve(bitmask_board).print_board_string())
+
+    def test_strategy_chain_solves_without_guessing(self):
+        # both stall after hidden singles; the first needs a naked triple, the second an x-wing
+        games = [("018002005000000003020300040000090002102000000094607000000061500700000000905070060",
+                  "318742695459816723627359841836195472172438956594627318243961587761584239985273164","naked_triple"),
+                 ("000700080020510040000000006030070800086009000540000000302007000400090100060108200",
+                  "693742581827516349154983726231674895786359412549821637312467958478295163965138274","x_wing")]
+        for (board_string,solution,strategy) in games:
+            for board_type in [suso.SudokuBoard,suso.BitmaskSudokuBoard,suso.GeneralSudokuBoard]:
+                board = board_type()
+                board.initialize_board_from_string(board_string)
+                board.apply_constraints_iteratively(hidden_singles=True)
+                self.assertLess(board.filled_cells(),81)
+
+                sink = suso.AggregatingSolverStats()
+                previous = suso.set_solver_stats(sink)
+                try:
+                    board.apply_constraints_iteratively(True,suso.STRATEGY_CHAIN)
+                finally:
+                    suso.set_solver_stats(previous)
+                self.assertEqual(board.print_board_string(),solution)
+                self.assertGreater(sink.counters["strategy_hits." + strategy],0)
+                self.assertGreater(sink.counters["strategy_hits.locked_candidates"],0)
+
+            # no strategy ever rules out the solution on the stalled board
+            board = suso.BitmaskSudokuBoard()
+            board.initialize_board_from_string(board_string)
+            board.apply_constraints_iteratively(hidden_singles=True)
+            candidates = suso.candidate_cube(board.candidates(),9)
+            solution_values = np.frombuffer(solution.encode("ascii"),dtype=np.uint8) - ord("1")
+            for (name,eliminate) in suso.STRATEGIES.items():
+                eliminated = eliminate(candidates,suso.BoardGeometry.for_box_size(3))
+                self.assertFalse(np.any(eliminated[np.arange(81),solution_values]),name)
+
+    def test_strategy_building_blocks(self):
+        self.assertEqual(suso.strategy_chain(),["naked_single"])
+        self.assertEqual(suso.strategy_chain(True,["x_wing","locked_candidates"]),["naked_single","hidden_single","locked_candidates","x_wing"])
+        with self.assertRaises(AssertionError):
+            suso.strategy_chain(strategies=["swordfish"])
+
+        # rows 0 and 1 share columns 0 and 1, so row 2 loses them; row 3 has too many entries to
+        # be part of a pair and row 4 too few
+        matrix = np.array([[[1,1,0,0],[1,1,0,0],[1,1,1,0],[1,1,1,1],[0,0,0,1]]],dtype=bool)
+        eliminated = suso.locked_sets(matrix,2)
+        self.assertEqual(eliminated[0].astype(int).tolist(),[[0,0,0,0],[0,0,0,0],[1,1,0,0],[1,1,0,0],[0,0,0,0]])
+        self.assertFalse(np.any(suso.locked_sets(matrix,3)[0,0:3]))
+
+    def test_verify_solutions(self):
+        solution = "568712943924653871731849256395287164246195387817364592682971435473528619159436728"
+        quiz = "068700900004000071030809050300080100040005007007304092602001005000020600059030028"
+        wrong = "5" + solution[2] + solution[1] + solution[3:]
+        solved = suso.quizzes_from_strings([solution,quiz,wrong,solution])
+        # the last expected solution is only the quiz, so its empty cells are not checked
+        solutions = suso.quizzes_from_strings([solution,solution,solution,quiz])
+        report = suso.verify_solutions(solved,solutions)
+        self.assertEqual(report.mismatched.tolist(),[False,False,True,False])
+        self.assertEqual(report.finished.tolist(),[True,False,True,True])
+        self.assertEqual(report.mismatch_cells.tolist(),[[2,1],[2,2]])
+
+        combined = suso.VerificationReport.concatenate([report,report])
+        self.assertEqual(combined.mismatched_boards().tolist(),[2,6])
+        self.assertEqual(combined.mismatch_cells[2:].tolist(),[[6,1],[6,2]])
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory,"verification.npz")
+            combined.save(path,solved=np.concatenate([solved,solved]))
+            loaded = suso.VerificationReport.load(path)
+            self.assertEqual(loaded.mismatch_cells.tolist(),combined.mismatch_cells.tolist())
+            self.assertEqual(loaded.finished.tolist(),combined.finished.tolist())
+            with np.load(path) as arrays:
+                self.assertEqual(arrays["solved"].shape,(8,81))
+
+        # the boards report a mismatch instead of failing an assert
+        for board_type in [suso.SudokuBoard,suso.BitmaskSudokuBoard,suso.GeneralSudokuBoard]:
+            board = board_type()
+            board.initialize_board_from_string(wrong)
+            self.assertFalse(board.check_solution_string(solution))
+            board.initialize_board_from_string(quiz)
+            self.assertTrue(board.check_solution_string(solution))
+
+        report = suso.verify_corpus("boards/sudoku_hard.csv")
+        self.assertEqual(len(report),41)
+        self.assertEqual(len(report.mismatched_boards()),0)
+
+    def test_play_game_with_exact_cover(self):
+        solver = suso.ExactCoverSolver()
+        # finnish.csv has the quiz as its solution column, zeros included
+        (board_string,solution) = open("boards/finnish.csv").read().split("\n")[1].split(",")[0:2]
+        for board_type in [suso.SudokuBoard,suso.BitmaskSudokuBoard]:
+            (board,iterations) = suso.play_game(board_string,solution,board_type,exact_cover_solver=solver)
+            self.assertEqual(board.filled_cells(),81)
+
+        # four solutions: whichever one the corpus lists, the one the solver finds passes
+        board_string = "508710040924653871701840050395287164246195387817364592682971435473528619159436728"
+        board = suso.BitmaskSudokuBoard()
+        board.initialize_board_from_string(board_string)
+        verifier = suso.GameVerifier()
+        for (game,solution) in enumerate(solver.find_solutions(board,limit=None)):
+            (solved,iterations) = suso.play_game(board_string,solution,suso.BitmaskSudokuBoard,exact_cover_solver=solver)
+            self.assertEqual(solved.unfilled_cells(),0)
+            self.assertFalse(solved.contradicted())
+            verifier.add(game,solved,solution,True)
+        (propagated,iterations) = suso.play_game(board_string,solution,suso.BitmaskSudokuBoard)
+        verifier.add("swapped",propagated,solution.translate(str.maketrans("12","21")))
+        self.assertEqual(verifier.verify(),["swapped"])
+        self.assertEqual(verifier.mismatched_games,["swapped"])
+
+    def test_run_many_games_with_solution_cache(self):
+        with tempfile.TemporaryDirectory() as directory:
+            hard_path = os.path.join(directory,"hardgames.csv")
+            (final_bincount,iter_bincount) = suso.run_many_games(45,input_path="boards/sudoku_hard.csv",hard_path=hard_path)
+            hard_games = len(list(suso.read_hard_games(hard_path)))
+            self.assertGreater(hard_games,0)
+
+            # the first run fills the cache, the second answers every unfinished game from it
+            # instead of searching. neither changes the propagation report or the hard games
+            for run in range(2):
+                cache = suso.SolutionCache(os.path.join(directory,"cache.csv"))
+                sink = suso.AggregatingSolverStats()
+                try:
+                    (cached_final,cached_iter) = suso.run_many_games(45,input_path="boards/sudoku_hard.csv",hard_path=hard_path,stats_sink=sink,solution_cache=cache)
+                finally:
+                    cache.close()
+                self.assertTrue(np.array_equal(cached_final,final_bincount))
+                self.assertTrue(np.array_equal(cached_iter,iter_bincount))
+                self.assertEqual(sink.counters.get("cache_hits",0),0 if run == 0 else hard_games)
+                self.assertNotIn("cache_mismatches",sink.counters)
+                self.assertEqual(sink.phase_calls.get("guess",0),hard_games if run == 0 else 0)
+                self.assertEqual(len(list(suso.read_hard_games(hard_path))),hard_games)
+
+            # cached solutions that do not fit the puzzle are searched again
+            cache_path = os.path.join(directory,"cache.csv")
+            with open(cache_path) as cache_file:
+                lines = [line.split(",") for line in cache_file.read().splitlines()]
+            with open(cache_path,"w") as cache_file:
+                cache_file.write("".join([f"{canonical},{solution.translate(str.maketrans('12','21'))}\n" for (canonical,solution) in lines]))
+            cache = suso.SolutionCache(cache_path)
+            sink = suso.AggregatingSolverStats()
+            try:
+                suso.run_many_games(45,input_path="boards/sudoku_hard.csv",hard_path=hard_path,stats_sink=sink,solution_cache=cache)
+            finally:
+                cache.close()
+            self.assertEqual(sink.counters["cache_mismatches"],hard_games)
+            self.assertEqual(sink.phase_calls["guess"],hard_games)
+
+    def test_checkpoint_flushes_the_solution_cache(self):
+        with tempfile.TemporaryDirectory() as directory:
+            hard_path = os.path.join(directory,"hardgames.csv")
+            cache_path = os.path.join(directory,"cache.csv")
+            checkpoint_path = os.path.join(directory,"checkpoint.json")
+            play_game = suso.play_game
+            played = []
+            def interrupted_play_game(*arguments, **keywords):
+                if len(played) == 25:
+                    raise KeyboardInterrupt()
+                played.append(arguments[0])
+                return play_game(*arguments,**keywords)
+            cache = suso.SolutionCache(cache_path)
+            suso.play_game = interrupted_play_game
+            try:
+                with self.assertRaises(KeyboardInterrupt):
+                    suso.run_many_games(45,input_path="boards/sudoku_hard.csv",hard_path=hard_path,solution_cache=cache,checkpoint_path=checkpoint_path,checkpoint_every=10)
+                # read back while the interrupted run still holds the cache open: everything
+                # cached before the checkpoint at game 20 is on disk
+                self.assertEqual(suso.read_checkpoint(checkpoint_path)["next_game"],20)
+                on_disk = suso.SolutionCache(cache_path)
+                on_disk.close()
+                self.assertGreater(len(on_disk),0)
+                self.assertGreaterEqual(len(on_disk),len([board_string for board_string in played[0:20]
+                                                           if suso.canonical_string(board_string)[0] in cache.solutions]))
+            finally:
+                suso.play_game = play_game
+                cache.close()
+
+    def test_batch_candidates_matches_contradicted(self):
+        # no cell of the first row can take a 1, although every cell still has candidates
+        quiz = np.zeros([81],dtype=np.uint8)
+        for (row,col) in [(1,3),(2,6),(3,0),(4,1),(5,2)]:
+            quiz[9*row+col] = 1
+        board = suso.BitmaskSudokuBoard()
+        board.initialize_board_from_string(suso.values_to_string(quiz))
+        self.assertTrue(board.contradicted())
+        candidates, valid = suso.batch_candidates(quiz.reshape([1,81]))
+        self.assertFalse(valid[0])
+        solved, iterations = suso.solve_batch(quiz.reshape([1,81]))
+        self.assertEqual(iterations[0], board.apply_constraints_iteratively())
+
+    def test_service_survives_a_failing_batch(self):
+        (quizzes,solutions) = suso.load_puzzles("boards/sudoku_hard.csv")
+        board_strings = [suso.values_to_string(quiz) for quiz in quizzes[0:2]]
+        solve_board_strings = service.solve_board_strings
+
+        def fail_on_first(lines, max_nodes=None):
+            if lines[0] == board_strings[0]:
+                raise ValueError("broken batch")
+            return solve_board_strings(lines,max_nodes)
+
+        async def serve():
+            solver_service = service.SolverService(max_batch=1,max_delay=0)
+            batcher = asyncio.create_task(solver_service.run())
+            responses = [await (await solver_service.submit(board_string)) for board_string in board_strings]
+            batcher.cancel()
+            return (responses,solver_service)
+
+        service.solve_board_strings = fail_on_first
+        try:
+            (responses,solver_service) = asyncio.run(serve())
+        finally:
+            service.solve_board_strings = solve_board_strings
+        self.assertEqual(responses,["error: ValueError: broken batch",suso.values_to_string(solutions[1])])
+        self.assertEqual(solver_service.failed_batches,1)
+        self.assertEqual(solver_service.batches,2)
+
+    def test_service_searches_from_the_propagated_board(self):
+        (quizzes,solutions) = suso.load_puzzles("boards/sudoku_hard.csv")
+        (propagated,iterations) = suso.solve_batch(quizzes[0:20])
+        unfinished = [i for i in range(20) if np.any(propagated[i] == 0)]
+        self.assertGreater(len(unfinished),0)
+        searched = []
+        solve = suso.DepthFirstSolver.solve
+
+        def recording_solve(solver, board, *args, **kwargs):
+            searched.append(board.print_board_string())
+            return solve(solver,board,*args,**kwargs)
+
+        suso.DepthFirstSolver.solve = recording_solve
+        try:
+            responses = service.solve_board_strings([suso.values_to_string(quiz) for quiz in quizzes[0:20]])
+        finally:
+            suso.DepthFirstSolver.solve = solve
+        self.assertEqual(responses,[suso.values_to_string(solution) for solution in solutions[0:20]])
+        self.assertEqual(searched,[suso.values_to_string(propagated[i]) for i in unfinished])
+
+    def test_resumed_run_with_solution_cache_matches_uninterrupted_run(self):
+        def run(directory, interrupt_after=None):
+            hard_path = os.path.join(directory,"hardgames.csv")
+            cache_path = os.path.join(directory,"cache.csv")
+            checkpoint_path = os.path.join(directory,"checkpoint.json")
+            if interrupt_after is not None:
+                play_game = suso.play_game
+                played = []
+                def interrupted_play_game(*arguments, **keywords):
+                    if len(played) == interrupt_after:
+                        raise KeyboardInterrupt()
+                    played.append(arguments[0])
+                    return play_game(*arguments,**keywords)
+                cache = suso.SolutionCache(cache_path)
+                suso.play_game = interrupted_play_game
+                try:
+                    with self.assertRaises(KeyboardInterrupt):
+                        suso.run_many_games(45,input_path="boards/sudoku_hard.csv",hard_path=hard_path,solution_cache=cache,checkpoint_path=checkpoint_path,checkpoint_every=10,resume=True)
+                finally:
+                    suso.play_game = play_game
+                    cache.close()
+            cache = suso.SolutionCache(cache_path)
+            try:
+                (final_bincount,iter_bincount) = suso.run_many_games(45,input_path="boards/sudoku_hard.csv",hard_path=hard_path,solution_cache=cache,checkpoint_path=checkpoint_path,checkpoint_every=10,resume=True)
+            finally:
+                cache.close()
+            with open(hard_path,"rb") as hard_file, open(cache_path,"rb") as cache_file:
+                return (final_bincount.tolist(),iter_bincount.tolist(),cache.hits,cache.misses,hard_file.read(),cache_file.read())
+
+        with tempfile.TemporaryDirectory() as directory:
+            uninterrupted = run(directory)
+        self.assertGreater(uninterrupted[3],0)
+        with tempfile.TemporaryDirectory() as directory:
+            # games 20 to 24 are solved and cached after the checkpoint, before the interruption
+            resumed = run(directory,interrupt_after=25)
+        self.assertEqual(resumed,uninterrupted)
+
+    def test_run_many_games_reports_wrong_solutions(self):
+        with tempfile.TemporaryDirectory() as directory:
+            # the third game's solution has two digits swapped
+            input_path = os.path.join(directory,"games.csv")
+            with open("boards/sudoku_hard.csv") as game_file:
+                lines = game_file.read().splitlines()
+            (board_string,solution) = lines[3].split(",")
+            lines[3] = board_string + "," + solution.translate(str.maketrans("12","21"))
+            with open(input_path,"w") as game_file:
+                game_file.write("\n".join(lines) + "\n")
+            hard_path = os.path.join(directory,"hardgames.csv")
+            (expected_final,expected_iter) = suso.run_many_games(41,input_path="boards/sudoku_hard.csv",hard_path=hard_path)
+
+            sink = suso.AggregatingSolverStats()
+            (final_bincount,iter_bincount) = suso.run_many_games(41,input_path=input_path,hard_path=hard_path,stats_sink=sink,checkpoint_every=8)
+            self.assertTrue(np.array_equal(final_bincount,expected_final))
+            self.assertEqual(sink.counters["solution_mismatches"],1)
+            self.assertEqual(sink.phase_calls["check"],6)
+
+            verifier = suso.GameVerifier(block_size=2)
+            for (game,line) in enumerate(lines[1:6]):
+                (board_string,solution) = line.split(",")
+                (sb,iterations) = suso.play_game(board_string,solution)
+                verifier.add(game,sb,solution)
+            self.assertEqual(verifier.mismatched_games,[2])
+            self.assertEqual(verifier.verify(),[])
 
 
 